@@ -1,19 +1,31 @@
 #
 # File: api_routes.py
-# Version: 4.10.0 (API Endpoints Info)
+# Version: 4.12.0 (Authentication Performance)
 #
 # Description: Defines all API endpoints for the pi_backend application.
 #
-# Changelog (v4.10.0):
-# - FEAT: Added new endpoint `/api/routes_info` to list all registered API endpoints,
-#   their HTTP methods, and a description (from the function's docstring).
-# - FEAT: Enhanced `/community/nearby` endpoint to accept `radius_m` or `radius_miles`
-#   and to return all POIs within the specified radius, including detailed info
-#   (address, phone, website).
-# - FEAT: Added `/space/weather` endpoint to retrieve space weather data.
-# - FEAT: Added `/space/moon` endpoint to retrieve moon information.
-# - FEAT: Added `/space/satellites/overhead` endpoint to retrieve overhead satellite data.
-# - FIX: Corrected the omission of astronomy services from the API layer.
+# Changelog (v4.12.0):
+# - PERF: `require_auth` uses `SecurityManager.verify_and_authorize`, so a
+#   Basic-auth request reads the user record once for both the password check
+#   and the role instead of twice.
+#
+# DEV_NOTES:
+# - v4.11.0:
+#   - PERF: `/space/satellites/overhead` reads the GPS position from
+#     `HardwareManager.get_gnss_snapshot` instead of building the full GNSS
+#     response dict.
+#   - PERF: The location test endpoint passes `config_manager` to reverse
+#     geocoding so it uses the configured geocode cache lifetime.
+# - v4.10.0:
+#   - FEAT: Added new endpoint `/api/routes_info` to list all registered API endpoints,
+#     their HTTP methods, and a description (from the function's docstring).
+#   - FEAT: Enhanced `/community/nearby` endpoint to accept `radius_m` or `radius_miles`
+#     and to return all POIs within the specified radius, including detailed info
+#     (address, phone, website).
+#   - FEAT: Added `/space/weather` endpoint to retrieve space weather data.
+#   - FEAT: Added `/space/moon` endpoint to retrieve moon information.
+#   - FEAT: Added `/space/satellites/overhead` endpoint to retrieve overhead satellite data.
+#   - FIX: Corrected the omission of astronomy services from the API layer.
 #
 from flask import Blueprint, request, jsonify, g, current_app
 from datetime import datetime, timezone
@@ -33,7 +45,7 @@ import astronomy_services
 from hardware_manager import HardwareManager 
 
 api_blueprint = Blueprint('api', __name__, url_prefix='/api')
-__version__ = "4.10.0"
+__version__ = "4.12.0"
 
 # --- Authentication Helpers ---
 def _make_error_response(message, status_code):
@@ -59,10 +71,12 @@ def require_auth(f):
                 return f(*args, **kwargs)
 
         if auth and auth.username and auth.password:
-            if security_manager.verify_credentials(auth.username, auth.password):
+            # One user lookup covers both the password check and the role
+            verified, role = security_manager.verify_and_authorize(auth.username, auth.password)
+            if verified:
                 g.authenticated_by = f"user:{auth.username}"
                 g.authenticated_username = auth.username
-                g.user_role = security_manager.get_user_role(auth.username)
+                g.user_role = role
                 return f(*args, **kwargs)
 
         return _make_error_response("Authentication Failed.", 401)
@@ -129,7 +143,8 @@ def test_location_services():
         elif lat and lon:
             result = location_services.reverse_geocode_from_coords(
                 float(lat), float(lon),
-                db_manager=db_manager
+                db_manager=db_manager,
+                config_manager=config_manager
             )
             return jsonify(result)
         else:
@@ -211,12 +226,12 @@ def get_overhead_satellites():
 
         # If lat/lon/alt not provided, try to get from GPS
         if lat is None or lon is None:
-            gps_data = current_app.config['HW_MANAGER'].get_best_gnss_data()
-            if gps_data and "error" not in gps_data and gps_data.get('latitude') is not None:
-                lat = gps_data['latitude']
-                lon = gps_data['longitude']
+            gnss = current_app.config['HW_MANAGER'].get_gnss_snapshot()
+            if gnss is not None and gnss.latitude is not None:
+                lat = gnss.latitude
+                lon = gnss.longitude
                 if alt_m is None: # Only use GPS altitude if not manually provided
-                    alt_m = gps_data.get('altitude_m', 0.0)
+                    alt_m = gnss.altitude_m
             else:
                 return _make_error_response("Could not determine location from GPS. Provide lat/lon/alt.", 500)
 
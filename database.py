@@ -1,6 +1,6 @@
 #
 # File: database.py
-# Version: 6.1.3 (UPS Metrics & Events)
+# Version: 6.3.0 (Authentication Performance)
 #
 # Description: This module provides a high-level, class-based interface for all database
 #              operations, including initialization, data insertion, and querying.
@@ -17,6 +17,15 @@
 # - v6.1.2: Added GOOGLE_PLACES_API_KEY to the API key management.
 # - v6.1.3: Added dedicated tables for UPS metrics and events (`ups_metrics`, `ups_events`).
 #           Implemented `add_ups_metric`, `add_ups_event`, and `get_latest_ups_metric`.
+# - v6.2.0: Added a `geocode_cache` table with `get_geocode` and `set_geocode`, so
+#           geocoding results persist across restarts instead of living in memory.
+#           Negative results are stored without coordinates and can be given a
+#           shorter lifetime. `set_geocode` can cap the table at `max_entries`
+#           rows, evicting the least recently fetched via the
+#           `idx_geocode_cache_fetched_at` index once the count is exceeded.
+# - v6.3.0: Argon2 hashing uses explicit, Pi-sized costs (`ARGON2_*` constants)
+#           instead of the library defaults; the `PH` instance is shared with
+#           SecurityManager.
 #
 import sqlite3
 import logging
@@ -25,12 +34,21 @@ from datetime import datetime, timedelta
 import json
 import os
 import secrets
+import time
+
+# Argon2id cost for password hashes: OWASP's minimum (19 MiB, 2 passes, 1 lane).
+# The library defaults (64 MiB, 3 passes, 4 lanes) take 500 ms+ per login on a Pi.
+ARGON2_TIME_COST = 2
+ARGON2_MEMORY_COST_KIB = 19456
+ARGON2_PARALLELISM = 1
 
 # Import Argon2 hasher
 try:
     from argon2 import PasswordHasher
     from argon2.exceptions import VerifyMismatchError
-    PH = PasswordHasher()
+    # Shared by SecurityManager; PasswordHasher is stateless and thread-safe
+    PH = PasswordHasher(time_cost=ARGON2_TIME_COST, memory_cost=ARGON2_MEMORY_COST_KIB,
+                        parallelism=ARGON2_PARALLELISM, hash_len=32, salt_len=16)
     ARGON2_AVAILABLE = True
     logging.info("DatabaseManager: Argon2 PasswordHasher initialized.")
 except ImportError:
@@ -234,10 +252,22 @@ class DatabaseManager:
                     event_type TEXT NOT NULL, -- e.g., 'STATUS_CHANGE', 'BATTERY_FULL', 'BATTERY_EMPTY'
                     details_json TEXT -- JSON blob of event details
                 );
+            """,
+            "geocode_cache": """
+                CREATE TABLE IF NOT EXISTS [geocode_cache] (
+                    query TEXT PRIMARY KEY, -- Normalized forward query or "lat,lon" for reverse lookups
+                    latitude REAL,
+                    longitude REAL,
+                    address TEXT,
+                    raw_json TEXT, -- Full JSON blob returned by the geocoder
+                    fetched_at INTEGER NOT NULL -- Unix time the result was fetched
+                );
             """
         }
         for table, schema in table_schemas.items():
             self.execute_query(schema)
+        # Lets set_geocode find the least recently fetched rows without sorting the table
+        self.execute_query("CREATE INDEX IF NOT EXISTS idx_geocode_cache_fetched_at ON geocode_cache(fetched_at)")
         logging.info("Database initialization complete.")
 
     # --- Configuration Management Methods (New) ---
@@ -702,3 +732,44 @@ class DatabaseManager:
         )
         return dict(record) if record else None
 
+    # --- Geocode Cache Methods ---
+    def get_geocode(self, query, max_age_seconds, negative_max_age_seconds=None):
+        """
+        Retrieves a cached geocoding result no older than `max_age_seconds`.
+        Negative results (stored without coordinates) expire after
+        `negative_max_age_seconds` instead, when given.
+        """
+        now = time.time()
+        if negative_max_age_seconds is None:
+            negative_max_age_seconds = max_age_seconds
+        record = self.execute_query(
+            "SELECT * FROM geocode_cache WHERE query = ? AND fetched_at >= CASE WHEN latitude IS NULL THEN ? ELSE ? END",
+            (query, int(now - negative_max_age_seconds), int(now - max_age_seconds)),
+            fetch='one'
+        )
+        if not record:
+            return None
+        result = dict(record)
+        if result['raw_json']:
+            result['raw_json'] = json.loads(result['raw_json'])
+        return result
+
+    def set_geocode(self, query, latitude, longitude, address=None, raw=None, max_entries=None):
+        """
+        Stores or refreshes a geocoding result in the cache. With `max_entries`,
+        the least recently fetched rows are evicted once the table exceeds that count.
+        """
+        self.execute_query(
+            "INSERT OR REPLACE INTO geocode_cache (query, latitude, longitude, address, raw_json, fetched_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (query, latitude, longitude, address, json.dumps(raw) if raw else None, int(time.time()))
+        )
+        if max_entries:
+            record = self.execute_query("SELECT COUNT(*) FROM geocode_cache", fetch='one')
+            excess = record[0] - max_entries if record else 0
+            if excess > 0:
+                self.execute_query(
+                    "DELETE FROM geocode_cache WHERE query IN (SELECT query FROM geocode_cache ORDER BY fetched_at LIMIT ?)",
+                    (excess,)
+                )
+        return True
+
@@ -1,15 +1,38 @@
 #
 # File: hardware.py
-# Version: 3.3.0 (Added Chrony Tracking Stats)
+# Version: 3.4.0 (Chrony Parsing Performance)
 #
 # Description: Provides functions to interact with Raspberry Pi hardware
 #              components like system stats, GPIO, Bluetooth, and chrony.
 #
-# Changelog (v3.3.0):
-# - FEATURE: Added `get_chrony_tracking_stats` to execute `chronyc tracking`
-#   and parse its output into a structured dictionary for the new time sync API.
+# Changelog (v3.4.0):
+# - PERF: `get_chrony_tracking_stats` now splits each `chronyc tracking` line
+#   once with `str.partition` and extracts numeric fields with a precompiled
+#   regex, instead of per-line `split`/`join` and per-field `.split()[0]` calls.
+# - PERF: `chronyc tracking` and `systemctl is-active chrony` are now started
+#   concurrently and awaited together, rather than run one after the other.
+# - PERF: The chrony service status is reused for `SERVICE_STATUS_TTL_SECONDS`
+#   instead of forking `systemctl is-active` on every time-sync API call.
+# - PERF: `get_cpu_usage` no longer blocks for 100 ms per call. It returns the
+#   usage since the previous sample, re-sampling at most every
+#   `CPU_SAMPLE_MIN_INTERVAL_SECONDS`.
+# - PERF: CPU, memory and boot time are read straight from /proc/stat and
+#   /proc/meminfo (boot time once per process), with psutil kept as the
+#   fallback on hosts without /proc. Disk usage still uses psutil.
+# - PERF: The chrony service state is read over a persistent systemd D-Bus
+#   connection when `pystemd` is installed, instead of forking `systemctl`.
+# - PERF: `chronyc`/`systemctl` output is read as bytes and only the returned
+#   fields are decoded, skipping a text-mode decode of the whole output.
+# - PERF: `chronyc tracking` output is split into fields with one multiline
+#   regex pass, and the returned fields come from the module-level
+#   `_CHRONY_FIELDS` table rather than per-call key normalisation.
+# - PERF: Numeric chrony fields are returned as floats instead of numeric
+#   strings, so API consumers no longer re-parse them.
 #
 # DEV_NOTES:
+# - v3.3.0:
+#   - FEATURE: Added `get_chrony_tracking_stats` to execute `chronyc tracking`
+#     and parse its output into a structured dictionary for the new time sync API.
 # - v3.2.0:
 #   - REFACTOR: Removed LTE modem power control functions. These are now
 #     handled by the dedicated `A7670E.py` module via the `HardwareManager`.
@@ -22,6 +45,7 @@ import psutil
 from datetime import datetime
 import re
 import logging
+import threading
 
 try:
     import RPi.GPIO as GPIO
@@ -30,6 +54,13 @@ except (ImportError, RuntimeError):
     GPIO_AVAILABLE = False
     print("[WARN] RPi.GPIO not found or failed to import. GPIO features disabled.", file=sys.stderr)
 
+try:
+    from pystemd.dbuslib import DBus
+    from pystemd.systemd1 import Unit as SystemdUnit
+    PYSTEMD_AVAILABLE = True
+except ImportError:
+    PYSTEMD_AVAILABLE = False
+
 try:
     import bluetooth
     BLUETOOTH_AVAILABLE = True
@@ -38,7 +69,7 @@ except ImportError:
     print("[WARN] PyBluez library not found. Bluetooth features disabled.", file=sys.stderr)
 
 
-__version__ = "3.3.0"
+__version__ = "3.4.0"
 
 # --- GPIO Setup (Only for general-purpose GPIO now, not LTE specific) ---
 _gpio_setup_done = False
@@ -64,18 +95,77 @@ def cleanup_gpio():
 
 _setup_gpio()
 
-# --- System Information (PSUTIL) ---
+# --- System Information (/proc, falling back to PSUTIL) ---
+PROC_STAT_PATH = '/proc/stat'
+PROC_MEMINFO_PATH = '/proc/meminfo'
+
+# Calls closer together than this reuse the previous CPU sample, since a shorter
+# window is dominated by scheduler tick granularity.
+CPU_SAMPLE_MIN_INTERVAL_SECONDS = 0.5
+
+def _read_cpu_times():
+    """Returns (busy, total) jiffies from the aggregate `cpu` line of /proc/stat."""
+    with open(PROC_STAT_PATH, 'rb') as f:
+        fields = f.readline().split()
+    # user nice system idle iowait irq softirq steal (guest time is already counted in user)
+    times = [int(value) for value in fields[1:9]]
+    total = sum(times)
+    return total - times[3] - times[4], total
+
+def _prime_cpu_sample():
+    """Takes the baseline sample the first `get_cpu_usage` call is measured against."""
+    try:
+        return (time.monotonic(), None) + _read_cpu_times()
+    except (OSError, ValueError):
+        # No /proc (non-Linux host): psutil keeps its own baseline
+        try:
+            psutil.cpu_percent(interval=None)
+        except Exception:
+            pass
+        return (time.monotonic(), None, None, None)
+
+# (time.monotonic() of the last sample, CPU usage percentage, busy jiffies, total jiffies)
+_cpu_sample = _prime_cpu_sample()
+# Boot time never changes while we are running, so it is read once
+_boot_timestamp = None
+
 def get_cpu_usage():
-    """Returns the current CPU usage percentage."""
+    """Returns the CPU usage percentage since the previous sample, without blocking."""
+    global _cpu_sample
     try:
-        return psutil.cpu_percent(interval=0.1)
+        sampled_at, usage, busy, total = _cpu_sample
+        now = time.monotonic()
+        if usage is None or now - sampled_at >= CPU_SAMPLE_MIN_INTERVAL_SECONDS:
+            if total is None:
+                usage = psutil.cpu_percent(interval=None)
+                _cpu_sample = (now, usage, None, None)
+            else:
+                new_busy, new_total = _read_cpu_times()
+                elapsed = new_total - total
+                usage = round(100.0 * (new_busy - busy) / elapsed, 1) if elapsed > 0 else 0.0
+                _cpu_sample = (now, usage, new_busy, new_total)
+        return usage
     except Exception as e:
         return {"error": f"Failed to get CPU usage: {e}"}
 
+def _read_memory_percent():
+    """Computes used memory from the MemTotal/MemAvailable lines at the top of /proc/meminfo."""
+    with open(PROC_MEMINFO_PATH, 'rb') as f:
+        head = f.read(512)
+    values = {}
+    for line in head.splitlines()[:3]:
+        key, _, rest = line.partition(b':')
+        values[key] = int(rest.split()[0])
+    total = values[b'MemTotal']
+    return round(100.0 * (total - values[b'MemAvailable']) / total, 1)
+
 def get_memory_usage():
     """Returns the current system memory usage percentage."""
     try:
-        return psutil.virtual_memory().percent
+        try:
+            return _read_memory_percent()
+        except (OSError, KeyError, ValueError, IndexError):
+            return psutil.virtual_memory().percent
     except Exception as e:
         return {"error": f"Failed to get memory usage: {e}"}
 
@@ -93,10 +183,24 @@ def get_disk_usage(path='/'):
     except Exception as e:
         return {"error": f"Failed to get disk usage for {path}: {e}"}
 
+def _read_boot_timestamp():
+    """Returns the boot time (epoch seconds) from the `btime` line of /proc/stat."""
+    with open(PROC_STAT_PATH, 'rb') as f:
+        for line in f:
+            if line.startswith(b'btime '):
+                return int(line.split()[1])
+    raise ValueError("btime not found in /proc/stat")
+
 def get_boot_time():
     """Returns the system boot time in a human-readable format."""
+    global _boot_timestamp
     try:
-        return datetime.fromtimestamp(psutil.boot_time()).strftime("%Y-%m-%d %H:%M:%S")
+        if _boot_timestamp is None:
+            try:
+                _boot_timestamp = _read_boot_timestamp()
+            except (OSError, ValueError):
+                _boot_timestamp = psutil.boot_time()
+        return datetime.fromtimestamp(_boot_timestamp).strftime("%Y-%m-%d %H:%M:%S")
     except Exception as e:
         return {"error": f"Failed to get boot time: {e}"}
 
@@ -117,44 +221,103 @@ def find_bluetooth_devices(duration=8):
         return {"error": f"Failed to scan for Bluetooth devices: {e}."}
 
 # --- Chrony Time Sync Functions ---
+# How long the `systemctl is-active chrony` result is reused before probing again
+SERVICE_STATUS_TTL_SECONDS = 3
+# (time.monotonic() of the last probe, status string)
+_chrony_service_status = (0.0, None)
+# Lazily opened system D-Bus connection; sd-bus connections are not thread-safe
+_systemd_bus = None
+_systemd_lock = threading.Lock()
+
+def _unit_active_state(unit_name):
+    """Returns a unit's ActiveState (e.g. 'active') via D-Bus, or None if D-Bus is unavailable."""
+    global _systemd_bus
+    if not PYSTEMD_AVAILABLE:
+        return None
+    try:
+        with _systemd_lock:
+            if _systemd_bus is None:
+                bus = DBus()
+                bus.open()
+                _systemd_bus = bus
+            unit = SystemdUnit(unit_name.encode(), bus=_systemd_bus, _autoload=True)
+            return unit.Unit.ActiveState.decode()
+    except Exception as e:
+        logging.debug(f"D-Bus state query for {unit_name} failed: {e}")
+        return None
+
+# Leading numeric token of a value such as b"+0.000012345 seconds".
+_NUM_RE = re.compile(rb'[-+]?\d+(?:\.\d+)?')
+
+def _chrony_num(value):
+    """Returns the leading number of a raw chrony value as a float, or 0.0."""
+    match = _NUM_RE.match(value) if value else None
+    # float() accepts the ASCII bytes directly, so there is no decode step
+    return float(match.group(0)) if match else 0.0
+
+def _chrony_text(value):
+    """Decodes a raw chrony value, or returns "N/A" if the field was missing."""
+    return value.decode('utf-8', 'replace') if value is not None else "N/A"
+
+# "Key name : value" lines of `chronyc tracking`; the key stops at the first colon.
+_CHRONY_LINE_RE = re.compile(rb'^([^:\n]+?)[ \t]*:[ \t]*(.*?)[ \t]*$', re.MULTILINE)
+
+# Returned field -> (chronyc key, converter). The schema is fixed, so it is resolved
+# once here instead of being spelled out as individual lookups on every call.
+_CHRONY_FIELDS = (
+    ("reference_id", b"Reference ID", _chrony_text),
+    ("stratum", b"Stratum", _chrony_text),
+    ("ref_time_utc", b"Ref time (UTC)", _chrony_text),
+    ("system_time_offset_s", b"System time", _chrony_num),
+    ("last_update_ago_s", b"Last offset", _chrony_num),
+    ("rms_offset_s", b"RMS offset", _chrony_num),
+    ("frequency_skew_ppm", b"Frequency", _chrony_num),
+    ("residual_freq_ppm", b"Residual freq", _chrony_num),
+    ("root_delay_s", b"Root delay", _chrony_num),
+    ("root_dispersion_s", b"Root dispersion", _chrony_num),
+    ("update_interval_s", b"Update interval", _chrony_num),
+    ("leap_status", b"Leap status", _chrony_text),
+)
+
 def get_chrony_tracking_stats():
     """
     Executes 'chronyc tracking' and parses the output into a structured dictionary.
     """
+    global _chrony_service_status
     try:
-        # Get chrony tracking data
-        result = subprocess.run(['chronyc', 'tracking'], capture_output=True, text=True, check=True)
-        tracking_output = result.stdout
-
-        # Get chrony service status
-        status_result = subprocess.run(['systemctl', 'is-active', 'chrony'], capture_output=True, text=True)
-        service_status = status_result.stdout.strip()
-
-        # Parse the output using regex or simple string splitting
-        stats = {}
-        for line in tracking_output.splitlines():
-            parts = line.split(':')
-            if len(parts) >= 2:
-                key = parts[0].strip().lower().replace(' ', '_')
-                value = ':'.join(parts[1:]).strip()
-                stats[key] = value
+        # Start `chronyc tracking` and, when the cached result has expired, the chrony
+        # service probe together so the two process spawns overlap
+        tracking_proc = subprocess.Popen(['chronyc', 'tracking'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        checked_at, service_status = _chrony_service_status
+        status_proc = None
+        try:
+            if service_status is None or time.monotonic() - checked_at >= SERVICE_STATUS_TTL_SECONDS:
+                service_status = _unit_active_state('chrony.service')
+                if service_status is None:
+                    status_proc = subprocess.Popen(['systemctl', 'is-active', 'chrony'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                else:
+                    _chrony_service_status = (time.monotonic(), service_status)
+        except BaseException:
+            # Reap the already running `chronyc` so a failed probe doesn't leave a zombie
+            tracking_proc.kill()
+            tracking_proc.communicate()
+            raise
+        tracking_output, tracking_error = tracking_proc.communicate()
+        if status_proc:
+            status_output, _ = status_proc.communicate()
+            service_status = status_output.strip().decode('utf-8', 'replace')
+            _chrony_service_status = (time.monotonic(), service_status)
+
+        if tracking_proc.returncode != 0:
+            raise subprocess.CalledProcessError(tracking_proc.returncode, tracking_proc.args, output=tracking_output, stderr=tracking_error.decode('utf-8', 'replace'))
+
+        # Split all "Key name : value" lines in a single regex pass over the raw output.
+        # Values stay as bytes and only the fields returned below are decoded.
+        stats = dict(_CHRONY_LINE_RE.findall(tracking_output))
 
         # Clean up and format the parsed data
-        parsed_data = {
-            "reference_id": stats.get("reference_id", "N/A"),
-            "stratum": stats.get("stratum", "N/A"),
-            "ref_time_utc": stats.get("ref_time", "N/A"),
-            "system_time_offset_s": stats.get("system_time", "0.0 seconds").split()[0],
-            "last_update_ago_s": stats.get("last_offset", "0.0 seconds").split()[0],
-            "rms_offset_s": stats.get("rms_offset", "0.0 seconds").split()[0],
-            "frequency_skew_ppm": stats.get("frequency", "0.0 ppm").split()[0],
-            "residual_freq_ppm": stats.get("residual_freq", "0.0 ppm").split()[0],
-            "root_delay_s": stats.get("root_delay", "0.0 seconds").split()[0],
-            "root_dispersion_s": stats.get("root_dispersion", "0.0 seconds").split()[0],
-            "update_interval_s": stats.get("update_interval", "0.0 seconds").split()[0],
-            "leap_status": stats.get("leap_status", "N/A"),
-            "service_status": service_status
-        }
+        parsed_data = {name: convert(stats.get(key)) for name, key, convert in _CHRONY_FIELDS}
+        parsed_data["service_status"] = service_status
         return parsed_data
 
     except FileNotFoundError:
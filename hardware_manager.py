@@ -1,26 +1,131 @@
 #
 # File: hardware_manager.py
-# Version: 2.6.0 (UPS Data from DB)
+# Version: 2.9.0 (LTE and Sensor Polling Performance)
 #
 # Description: This module acts as a central abstraction layer for hardware.
 #
-# Changelog (v2.6.0):
-# - FEAT: `get_ups_data` now reads the latest UPS metrics directly from the
-#   main application database (`pi_backend.db`) via `DatabaseManager`.
-# - REFACTOR: Removed all direct dependencies and references to `ups_daemon.py`
-#   and its state file, as UPS data logging is now handled by `ups_status.py`
-#   logging directly to the main database.
-# - FIX: Ensured INA219.py is no longer loaded or used by HardwareManager,
-#   as its readings are obtained from the database.
+# Changelog (v2.9.0):
+# - PERF: `get_lte_network_info` sends its three AT queries with
+#   `send_at_batch`, so the modem port (and the gpsd stop/start around it) is
+#   leased once per request instead of once per query.
+# - FIX: The UPS read connection no longer switches pi_backend.db to WAL. The
+#   journal mode is stored in the database file, so it changed the mode for
+#   every process, and root-owned -wal/-shm files left by setup.py made the
+#   www-data services fail with SQLITE_READONLY_CANTINIT.
+#
+# DEV_NOTES:
+# - v2.8.0:
+#   - PERF: Socket errors on the gpsd connection (resets, timeouts) now reconnect
+#     after the same 5s back-off as a closed stream instead of the 10s
+#     unexpected-error path, and are logged without a traceback.
+#   - PERF: gpsd lines that are not TPV/SKY reports are rejected by a byte
+#     check on the line head in the reader thread, so they are never queued or
+#     JSON-decoded.
+#   - PERF: `get_ups_data` keys its cached result on the database (and WAL)
+#     file modification times. Past the `UPS_DATA_TTL_SECONDS` floor a poll
+#     costs one `stat` unless a new metric has actually been written.
+#   - PERF: Concurrent `get_ups_data` callers that find the cache expired wait on
+#     a single in-flight refresh instead of each querying the database.
+#   - PERF: The GPS snapshot is a plain tuple attribute swapped by the parser
+#     thread (its only writer) instead of a `deque(maxlen=1)` slot, so reads are
+#     a single attribute load.
+#   - PERF: `get_gpsd_status` checks all services with one `systemctl
+#     is-active` invocation instead of one process per service.
+#   - PERF: The `get_gpsd_status` cache TTL is configurable as
+#     `[Hardware] Service_Status_TTL_Seconds` (default 3s) and stored as an
+#     expiry time, so a cache hit is a single comparison.
+#   - PERF: UPS metrics are read through a long-lived connection and
+#     cursor owned by `HardwareManager`, instead of a new connection per query.
+#   - PERF: `close_all` wakes the GPS parser thread with a sentinel instead of
+#     waiting for its queue poll to time out.
+#   - REFACTOR: The three identical hardware module instantiation branches in
+#     `_load_module` are collapsed into one call.
+#   - PERF: The gpsd `?WATCH` request explicitly disables NMEA, raw and PPS
+#     output, keeping the stream to the JSON reports the reader uses.
+#   - PERF: `get_best_gnss_data` maps the gpsd mode through the `_FIX_TYPE_NAMES`
+#     tuple, falling back to "Unknown" for a non-integer or out-of-range mode.
+#   - PERF: Failed gpsd connections back off exponentially (2s doubling up to
+#     `GPS_RECONNECT_MAX_SECONDS`), resetting once reports flow again, instead of
+#     retrying every 5-10s indefinitely.
+#   - PERF: When `inotify_simple` is installed, a watcher thread bumps a write
+#     generation on every database change, and `get_ups_data` serves its cached
+#     result until then without any stat calls.
+#   - PERF: SKY reports are no longer JSON-decoded; `uSat`/`nSat` are pulled from the raw line with a regex and
+#     the full report is decoded only if `get_raw_gps_cache` asks for it.
+#   - PERF: Log calls in the GPS reader and parser threads use lazy %-style
+#     arguments, so skipped lines are not formatted unless DEBUG is enabled.
+#   - PERF: While gpsd refuses connections, `get_best_gnss_data` returns a
+#     prebuilt "no fix" response instead of inspecting the stale snapshot.
+#   - PERF: `get_gnss_snapshot` returns the latest fix as a `__slots__`
+#     `GnssSnapshot` for in-process callers; the dict is only built by
+#     `get_best_gnss_data` for API responses.
+#   - PERF: The UPS read connection enables SQLite memory-mapped I/O
+#     (`UPS_DB_MMAP_SIZE`), so hot pages are read from the mapping instead of
+#     being copied in with read().
+#   - FIX: UPS data was always reported as "Database not connected" because
+#     `DatabaseManager` closes its connection after every query.
+# - v2.7.0:
+#   - PERF: The GPS reader thread now connects to gpsd's JSON socket
+#     (localhost:2947) directly instead of spawning and parsing `gpspipe -w`,
+#     removing a child process and the text-mode pipe from the streaming path.
+#   - PERF: GPS reports are decoded with `orjson` when it is installed, falling
+#     back to the standard library `json` module otherwise.
+#   - PERF: The GPS cache is now copy-on-write: the reader thread publishes a new
+#     `(tpv, sky, last_update)` snapshot per report into a single-slot
+#     `deque(maxlen=1)` instead of mutating a shared dict under `_gps_lock`, so
+#     API reads take a single reference without locking or copying.
+#   - PERF: GPS streaming is split into a socket reader thread and a parser
+#     thread joined by a bounded FIFO queue, so decoding never delays the reader.
+#   - PERF: The socket reader frames lines out of one preallocated `bytearray`
+#     filled with `recv_into`, instead of going through a buffered file object.
+#   - PERF: `get_gpsd_status` caches its `systemctl is-active` results for
+#     `SERVICE_STATUS_TTL_SECONDS`, so dashboard polling no longer forks per call.
+#   - PERF: Hardware modules are now loaded and initialized concurrently, so
+#     startup waits for the slowest device instead of the sum of all of them.
+#   - PERF: The gpsd fix-mode names are a module-level tuple indexed by mode
+#     instead of a dict rebuilt on every `get_best_gnss_data` call.
+#   - PERF: Hardware modules are imported as `modules.<name>` through the normal
+#     import system (and its .pyc cache) instead of being re-executed from
+#     source with `spec_from_file_location`. The `modules` directory is no
+#     longer prepended to `sys.path`, so `modules/sense_hat.py` no longer
+#     shadows the system `sense_hat` library.
+#   - PERF: The gpsd reader waits on a selector with a
+#     `GPS_POLL_INTERVAL_SECONDS` timeout instead of blocking in `recv`, and its
+#     reconnect delays wait on the stop event, so `close_all` no longer stalls
+#     until its join timeout.
+#   - PERF: The latest TPV/SKY reports are cached as `__slots__` records
+#     (`_TPV`, `_SKY`) built once per report, so `get_best_gnss_data` reads
+#     attributes instead of repeating `dict.get` lookups on every call.
+#   - PERF: Service states are queried over one persistent systemd D-Bus
+#     connection when `pystemd` is installed, falling back to `systemctl`.
+#   - PERF: `get_ups_data` reuses its last result for `UPS_DATA_TTL_SECONDS`, so
+#     bursts of API polls share one database read.
+#   - PERF: `systemctl is-active` output is read as bytes and decoded once.
+#   - FIX: `get_raw_gps_cache` no longer hands out references to the live
+#     TPV/SKY report dicts.
+# - v2.6.0:
+#   - FEAT: `get_ups_data` now reads the latest UPS metrics directly from the
+#     main application database (`pi_backend.db`) via `DatabaseManager`.
+#   - REFACTOR: Removed all direct dependencies and references to `ups_daemon.py`
+#     and its state file, as UPS data logging is now handled by `ups_status.py`
+#     logging directly to the main database.
+#   - FIX: Ensured INA219.py is no longer loaded or used by HardwareManager,
+#     as its readings are obtained from the database.
 #
 import sys
 import os
 import logging
-import importlib.util
+import re
+import importlib
 import subprocess
 import threading
 import json
+import socket
+import sqlite3
+import selectors
+import queue
 import time
+import concurrent.futures
 
 # Import DatabaseManager to fetch UPS data from the main database
 # Adjust path if necessary based on your project structure
@@ -28,7 +133,31 @@ script_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, os.path.abspath(os.path.join(script_dir, '..')))
 from database import DatabaseManager
 
-__version__ = "2.6.0"
+# orjson decodes the gpsd report stream several times faster than stdlib json
+try:
+    import orjson
+    _json_loads = orjson.loads
+    ORJSON_AVAILABLE = True
+except ImportError:
+    _json_loads = json.loads
+    ORJSON_AVAILABLE = False
+
+# inotify lets the UPS cache be invalidated by database writes instead of stat polling
+try:
+    from inotify_simple import INotify, flags as inotify_flags
+    INOTIFY_AVAILABLE = True
+except ImportError:
+    INOTIFY_AVAILABLE = False
+
+# pystemd talks to systemd over D-Bus, avoiding a `systemctl` fork per status query
+try:
+    from pystemd.dbuslib import DBus
+    from pystemd.systemd1 import Unit as SystemdUnit
+    PYSTEMD_AVAILABLE = True
+except ImportError:
+    PYSTEMD_AVAILABLE = False
+
+__version__ = "2.9.0"
 
 # Configure logging for this module
 logging.basicConfig(level=logging.INFO, stream=sys.stdout, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -36,6 +165,144 @@ logging.basicConfig(level=logging.INFO, stream=sys.stdout, format='%(asctime)s -
 # Define the path to the main pi_backend database
 DEFAULT_PI_BACKEND_DB_PATH = "/var/lib/pi_backend/pi_backend.db"
 
+# gpsd's JSON socket and the watch command that starts the TPV/SKY report stream. NMEA,
+# raw and PPS output are turned off explicitly so gpsd never spends time encoding them.
+GPSD_HOST = "127.0.0.1"
+GPSD_PORT = 2947
+GPSD_WATCH_COMMAND = b'?WATCH={"enable":true,"json":true,"nmea":false,"raw":0,"pps":false}\n'
+# Raw gpsd lines buffered between the socket reader and the parser; lines are dropped when full
+GPS_RAW_QUEUE_SIZE = 256
+# Size of the reusable receive buffer; gpsd reports are far smaller than this
+GPS_READ_BUFFER_SIZE = 16384
+# How often a reader blocked on a quiet gpsd socket wakes up to check for shutdown
+GPS_POLL_INTERVAL_SECONDS = 0.1
+# Upper bound for the exponential back-off between failed gpsd connection attempts
+GPS_RECONNECT_MAX_SECONDS = 30
+# gpsd writes "class" as the first member of every report, so TPV/SKY lines can be
+# recognised from the head of their raw bytes and everything else skipped undecoded
+GPS_CLASS_SCAN_BYTES = 20
+# Default for how long `systemctl is-active` results are reused before probing again;
+# `get_gpsd_status` reads [Hardware] Service_Status_TTL_Seconds when it is configured
+SERVICE_STATUS_TTL_SECONDS = 3
+# How long a `get_ups_data` result is served before the database files are stat'ed again
+UPS_DATA_TTL_SECONDS = 0.25
+# How often the UPS database watcher wakes up to check for shutdown
+UPS_WATCH_POLL_MS = 500
+# Bytes of the database SQLite may memory-map for UPS reads, so pages are read without a copy
+UPS_DB_MMAP_SIZE = 16 * 1024 * 1024
+# Latest UPS reading; run on a long-lived connection so sqlite3 reuses the prepared statement
+UPS_LATEST_METRIC_QUERY = "SELECT * FROM ups_metrics ORDER BY timestamp DESC LIMIT 1"
+# Returned by get_best_gnss_data while gpsd is not accepting connections
+_GPS_UNAVAILABLE_RESPONSE = {"error": "gpsd is not reachable. GPS data unavailable.", "fix_type": "No Fix"}
+# Human-readable fix type for each gpsd TPV `mode` value (0 = unknown, 1 = no fix)
+_FIX_TYPE_NAMES = ('No Fix', 'No Fix', '2D Fix', '3D Fix')
+
+
+class _TPV:
+    """The fields of a gpsd TPV report used by the API, extracted once per report."""
+    __slots__ = ('mode', 'lat', 'lon', 'alt', 'speed', 'track', 'climb', 'time', 'epx', 'epv', 'raw')
+
+    def __init__(self, report):
+        get = report.get
+        self.mode = get('mode', 0)
+        self.lat = get('lat')
+        self.lon = get('lon')
+        # Prefer height above ellipsoid, then MSL, then the legacy field; 0.0 is a valid altitude
+        altitude = get('altHAE')
+        if altitude is None:
+            altitude = get('altMSL')
+        if altitude is None:
+            altitude = get('alt')
+        self.alt = altitude
+        self.speed = get('speed')
+        self.track = get('track')
+        self.climb = get('climb')
+        self.time = get('time')
+        self.epx = get('epx')
+        self.epv = get('epv')
+        self.raw = report
+
+
+# Satellite counts in a raw SKY line; they are read without decoding the satellites array
+_SKY_USAT_RE = re.compile(rb'"uSat":\s*(\d+)')
+_SKY_NSAT_RE = re.compile(rb'"nSat":\s*(\d+)')
+
+
+class _SKY:
+    """The satellite counts of a gpsd SKY report, extracted once per report."""
+    __slots__ = ('uSat', 'nSat', '_report', '_line')
+
+    def __init__(self, report):
+        self.uSat = report.get('uSat', 0)
+        self.nSat = report.get('nSat', 0)
+        self._report = report
+        self._line = None
+
+    @classmethod
+    def from_line(cls, line):
+        """Builds a record from a raw SKY line, deferring the full JSON decode until `raw` is read."""
+        sky = cls.__new__(cls)
+        match = _SKY_USAT_RE.search(line)
+        sky.uSat = int(match.group(1)) if match else 0
+        match = _SKY_NSAT_RE.search(line)
+        sky.nSat = int(match.group(1)) if match else 0
+        sky._report = None
+        sky._line = line
+        return sky
+
+    @property
+    def raw(self):
+        """The full SKY report, decoded on first access for records built from a line."""
+        if self._report is None:
+            try:
+                self._report = _json_loads(self._line)
+            except ValueError:
+                self._report = {"class": "SKY", "error": "Malformed SKY report"}
+        return self._report
+
+
+class GnssSnapshot:
+    """
+    A GNSS fix as returned by `HardwareManager.get_gnss_snapshot`. In-process
+    callers read its attributes directly; `to_dict` produces the API payload.
+    """
+    __slots__ = ('source', 'fix_type', 'latitude', 'longitude', 'altitude_m', 'speed_mps',
+                 'track_deg', 'climb_mps', 'time_utc', 'satellites_used', 'satellites_in_view',
+                 'error_horizontal_m', 'error_vertical_m')
+
+    def __init__(self, tpv, sky, fix_type):
+        self.source = "Realtime gpsd Stream"
+        self.fix_type = fix_type
+        self.latitude = tpv.lat
+        self.longitude = tpv.lon
+        self.altitude_m = tpv.alt
+        self.speed_mps = tpv.speed
+        self.track_deg = tpv.track
+        self.climb_mps = tpv.climb
+        self.time_utc = tpv.time
+        self.satellites_used = sky.uSat
+        self.satellites_in_view = sky.nSat
+        self.error_horizontal_m = tpv.epx
+        self.error_vertical_m = tpv.epv
+
+    def to_dict(self):
+        """Returns the snapshot as the JSON-ready dict served by the GNSS endpoints."""
+        return {
+            "source": self.source,
+            "fix_type": self.fix_type,
+            "latitude": self.latitude,
+            "longitude": self.longitude,
+            "altitude_m": self.altitude_m,
+            "speed_mps": self.speed_mps,
+            "track_deg": self.track_deg,
+            "climb_mps": self.climb_mps,
+            "time_utc": self.time_utc,
+            "satellites_used": self.satellites_used,
+            "satellites_in_view": self.satellites_in_view,
+            "error_horizontal_m": self.error_horizontal_m,
+            "error_vertical_m": self.error_vertical_m,
+        }
+
 
 class HardwareManager:
     """
@@ -43,7 +310,6 @@ class HardwareManager:
     Includes a real-time GPS streaming thread.
     """
     _instance = None
-    _gps_lock = threading.Lock()
 
     def __new__(cls, *args, **kwargs):
         if cls._instance is None:
@@ -60,95 +326,213 @@ class HardwareManager:
         
         # Initialize DatabaseManager for accessing UPS data
         self.db_manager = DatabaseManager(database_path=DEFAULT_PI_BACKEND_DB_PATH)
-        if self.db_manager.connection is None:
+        # DatabaseManager connects per query; UPS polling keeps its own connection and cursor
+        self._ups_conn, self._ups_cursor = self._open_ups_connection()
+        if self._ups_cursor is None:
             logging.critical("HardwareManager: Failed to connect to main database. UPS data will be unavailable.")
 
-        self._latest_gps_data = {
-            "TPV": {"class": "TPV", "mode": 0},
-            "SKY": {"class": "SKY", "satellites": []},
-            "last_update": 0
-        }
+        # Immutable (tpv, sky, last_update) snapshot. The parser thread is the only writer
+        # and replaces it with a plain assignment; readers take the reference without locking.
+        # NOTE: The snapshot is process-local on purpose. Other processes (e.g. data_poller.py)
+        # get the same reports by opening their own gpsd watch; gpsd is the cross-process fan-out.
+        self._gps_snapshot = (_TPV({"class": "TPV", "mode": 0}), _SKY({"class": "SKY", "satellites": []}), 0)
+        # Cleared while gpsd refuses connections, so GNSS reads can answer without touching the snapshot
+        self._gps_available = True
+        self._gps_raw_queue = queue.Queue(maxsize=GPS_RAW_QUEUE_SIZE)
         self._stop_gps_thread = threading.Event()
         self._gps_thread = threading.Thread(target=self._gps_reader_thread, daemon=True)
+        self._gps_parse_thread = threading.Thread(target=self._gps_parser_thread, daemon=True)
+        # (time.monotonic() expiry, status report)
+        self._gpsd_status_cache = (0.0, None)
+        self._service_status_ttl = SERVICE_STATUS_TTL_SECONDS
+        if app_config:
+            self._service_status_ttl = app_config.getfloat('Hardware', 'Service_Status_TTL_Seconds', fallback=SERVICE_STATUS_TTL_SECONDS)
+        self._systemd_bus = self._open_systemd_bus()
+        # (time.monotonic() expiry, database file stamp, UPS data dict)
+        self._ups_cache = (0.0, None, None)
+        # Single-flight refresh: one caller reads the database while the others wait for its result
+        self._ups_cond = threading.Condition()
+        self._ups_refreshing = False
+        # Bumped by the inotify watcher on every database write; the cache is keyed on it when watching
+        self._ups_generation = 0
+        self._stop_ups_watch = threading.Event()
+        # Set before the watcher starts and cleared only by the watcher thread itself
+        self._ups_watch_ok = False
+        self._ups_watcher = self._start_ups_watcher()
+        # sd-bus connections are not thread-safe; API handlers share this one
+        self._systemd_lock = threading.Lock()
 
         logging.info(f"HardwareManager: Initializing (Version {__version__})")
 
-        if os.path.join(script_dir, 'modules') not in sys.path:
-            sys.path.insert(0, os.path.join(script_dir, 'modules'))
-
-        # Load all hardware modules
-        self._load_module_by_path("A7670E", "A7670E", "LTE Modem (A7670E)", os.path.join(script_dir, 'modules', 'A7670E.py'))
-        self._load_module_by_path("sense_hat", "SenseHatManager", "Sense HAT", os.path.join(script_dir, 'modules', 'sense_hat.py'))
+        # Load all hardware modules. Their initializers are independent and mostly wait on
+        # device I/O, so they run in parallel; each load handles its own failures.
+        hardware_modules = [
+            ("A7670E", "A7670E", "LTE Modem (A7670E)"),
+            ("sense_hat", "SenseHatManager", "Sense HAT"),
+        ]
         # NOTE: INA219 is no longer loaded here. Its readings are handled by ups_status.py logging to DB.
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(hardware_modules)) as executor:
+            futures = [executor.submit(self._load_module, *module) for module in hardware_modules]
+            for future in futures:
+                future.result()
 
 
+        self._gps_parse_thread.start()
         self._gps_thread.start()
-        logging.info("HardwareManager: Real-time GPS streaming thread started.")
+        logging.info("HardwareManager: Real-time GPS streaming threads started.")
 
         self._initialized = True
         logging.info("HardwareManager: Initialization complete.")
 
     def _gps_reader_thread(self):
-        """A background thread that continuously reads JSON data from gpsd using gpspipe."""
+        """A background thread that continuously reads JSON reports from the gpsd socket."""
         logging.info("GPS Reader Thread: Starting up...")
-        process = None
+        consecutive_failures = 0
         while not self._stop_gps_thread.is_set():
+            sock = None
             try:
-                # Use 'gpspipe -w' for a clean JSON stream of TPV and SKY reports.
-                process = subprocess.Popen(['gpspipe', '-w'], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, bufsize=1)
-                for line in iter(process.stdout.readline, ''):
+                # Read gpsd's JSON stream directly; this is the same stream `gpspipe -w` relays.
+                sock = socket.create_connection((GPSD_HOST, GPSD_PORT), timeout=10)
+                self._gps_available = True
+                sock.settimeout(None)
+                sock.sendall(GPSD_WATCH_COMMAND)
+                for line in self._iter_gpsd_lines(sock):
                     if self._stop_gps_thread.is_set():
                         break
+                    consecutive_failures = 0
+                    head = line[:GPS_CLASS_SCAN_BYTES]
+                    if b'"TPV"' not in head and b'"SKY"' not in head:
+                        # VERSION, DEVICES, WATCH, PPS, ... are never used
+                        continue
                     try:
-                        data = json.loads(line.strip())
-                        if 'class' in data:
-                            with self._gps_lock:
-                                # We only care about TPV (Time-Position-Velocity) and SKY (Satellite) reports
-                                if data['class'] in ['TPV', 'SKY']:
-                                    self._latest_gps_data[data['class']] = data
-                                    self._latest_gps_data["last_update"] = time.time()
-                    except json.JSONDecodeError:
-                        logging.debug(f"GPS Reader Thread: Skipping non-JSON line: {line.strip()}")
+                        self._gps_raw_queue.put_nowait(line)
+                    except queue.Full:
+                        # The parser is behind; drop the line rather than stall the socket
+                        pass
 
                 if self._stop_gps_thread.is_set():
                     break
 
-                logging.warning("GPS Reader Thread: `gpspipe -w` stream ended. Restarting in 5s.")
-                time.sleep(5)
-
-            except FileNotFoundError:
-                logging.critical("GPS Reader Thread: `gpspipe` command not found. GPS streaming is disabled. Please ensure 'gpsd-clients' is installed.")
-                return
+                logging.warning("GPS Reader Thread: gpsd stream ended. Reconnecting in 5s.")
+                self._stop_gps_thread.wait(5)
+
+            except ConnectionRefusedError:
+                self._gps_available = False
+                consecutive_failures += 1
+                delay = min(GPS_RECONNECT_MAX_SECONDS, 2 ** consecutive_failures)
+                logging.warning("GPS Reader Thread: gpsd is not listening on %s:%s. Retrying in %ss.", GPSD_HOST, GPSD_PORT, delay)
+                self._stop_gps_thread.wait(delay)
+            except OSError as e:
+                # Resets and timeouts on an established gpsd connection are routine; reconnect promptly
+                consecutive_failures += 1
+                delay = min(GPS_RECONNECT_MAX_SECONDS, 2 ** consecutive_failures)
+                logging.warning("GPS Reader Thread: gpsd socket error: %s. Reconnecting in %ss.", e, delay)
+                self._stop_gps_thread.wait(delay)
             except Exception as e:
-                logging.error(f"GPS Reader Thread: Error occurred: {e}. Restarting in 10s.", exc_info=True)
-                time.sleep(10)
+                consecutive_failures += 1
+                delay = min(GPS_RECONNECT_MAX_SECONDS, 2 ** consecutive_failures)
+                logging.error("GPS Reader Thread: Error occurred: %s. Restarting in %ss.", e, delay, exc_info=True)
+                self._stop_gps_thread.wait(delay)
             finally:
-                if process:
-                    process.kill()
+                if sock:
+                    sock.close()
 
-    def _load_module_by_path(self, module_name, class_name, friendly_name, file_path):
-        """Dynamically loads a module from a file path with robust error handling."""
-        try:
-            if not os.path.exists(file_path):
-                logging.warning(f"HardwareManager: Module file '{file_path}' not found. {friendly_name} unavailable.")
-                return
+    def _iter_gpsd_lines(self, sock):
+        """
+        Yields newline-delimited gpsd reports read from `sock` into a single
+        reusable buffer. Stops when gpsd closes the connection or the GPS
+        threads are asked to stop.
+        """
+        buf = bytearray(GPS_READ_BUFFER_SIZE)
+        view = memoryview(buf)
+        filled = 0
+        discarding = False
+        with selectors.DefaultSelector() as sel:
+            sel.register(sock, selectors.EVENT_READ)
+            while True:
+                # Wait with a timeout rather than blocking in recv, so shutdown is
+                # noticed even when gpsd has nothing to send
+                ready = sel.select(timeout=GPS_POLL_INTERVAL_SECONDS)
+                if self._stop_gps_thread.is_set():
+                    return
+                if not ready:
+                    continue
+                received = sock.recv_into(view[filled:])
+                if not received:
+                    return
+                filled += received
+
+                start = 0
+                end = buf.find(b'\n', start, filled)
+                while end >= 0:
+                    if discarding:
+                        # Tail of an oversized report whose head was already dropped
+                        discarding = False
+                    elif end > start:
+                        yield bytes(view[start:end])
+                    start = end + 1
+                    end = buf.find(b'\n', start, filled)
+
+                if start:
+                    # Move the trailing partial line to the front of the buffer
+                    buf[:filled - start] = view[start:filled]
+                    filled -= start
+                elif filled == len(buf):
+                    if not discarding:
+                        logging.warning("GPS Reader Thread: Discarding oversized gpsd report.")
+                    discarding = True
+                    filled = 0
+
+    def _gps_parser_thread(self):
+        """A background thread that decodes queued gpsd lines and publishes TPV/SKY reports."""
+        while not self._stop_gps_thread.is_set():
+            try:
+                line = self._gps_raw_queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            if line is None:
+                # Shutdown sentinel queued by close_all
+                break
+            try:
+                if b'"SKY"' in line[:GPS_CLASS_SCAN_BYTES]:
+                    # The satellites array dominates a SKY report but only its counts are served,
+                    # so skip the full decode
+                    tpv_data, _, _ = self._gps_snapshot
+                    self._gps_snapshot = (tpv_data, _SKY.from_line(line), time.time())
+                    continue
+                data = _json_loads(line)
+                # We only care about TPV (Time-Position-Velocity) and SKY (Satellite) reports
+                report_class = data.get('class')
+                if report_class not in ('TPV', 'SKY'):
+                    continue
+                # Publish a new snapshot; readers holding the old one are unaffected
+                tpv_data, sky_data, _ = self._gps_snapshot
+                if report_class == 'TPV':
+                    self._gps_snapshot = (_TPV(data), sky_data, time.time())
+                else:
+                    self._gps_snapshot = (tpv_data, _SKY(data), time.time())
+            except ValueError:
+                # Lazy %-style arguments: the line is only formatted if DEBUG is enabled
+                logging.debug("GPS Parser Thread: Skipping non-JSON line: %r", line)
+            except Exception as e:
+                logging.error("GPS Parser Thread: Failed to process report: %s", e, exc_info=True)
 
-            spec = importlib.util.spec_from_file_location(module_name, file_path)
-            if spec is None:
-                logging.error(f"Could not create module spec for {friendly_name} at {file_path}")
+    def _load_module(self, module_name, class_name, friendly_name):
+        """Imports a hardware module from the `modules` package with robust error handling."""
+        qualified_name = f"modules.{module_name}"
+        try:
+            try:
+                # A regular import goes through the import cache and reuses compiled .pyc files
+                module = importlib.import_module(qualified_name)
+            except ModuleNotFoundError as e:
+                if e.name not in (qualified_name, "modules"):
+                    raise
+                logging.warning(f"HardwareManager: Module '{qualified_name}' not found. {friendly_name} unavailable.")
                 return
-                
-            module = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(module)
             manager_class = getattr(module, class_name)
-            
-            # Special handling for SenseHatManager and A7670E which need to be instantiated without args or with implicit args
-            if friendly_name == "Sense HAT":
-                self._loaded_modules[friendly_name] = manager_class() # SenseHatManager initializes itself
-            elif friendly_name == "LTE Modem (A7670E)":
-                self._loaded_modules[friendly_name] = manager_class() # A7670E initializes without direct serial port connection
-            else:
-                self._loaded_modules[friendly_name] = manager_class() # Generic instantiation
+
+            # SenseHatManager and A7670E both initialize themselves without arguments
+            self._loaded_modules[friendly_name] = manager_class()
 
             logging.info(f"HardwareManager: Successfully loaded and initialized {friendly_name}.")
         except Exception as e:
@@ -163,14 +547,122 @@ class HardwareManager:
     # --- UPS HAT Methods (Modified to read from main DB) ---
     def get_ups_data(self):
         """
-        Retrieves UPS data from the main database.
+        Retrieves UPS data from the main database. The previous result is reused
+        for UPS_DATA_TTL_SECONDS, and after that for as long as the database
+        files have not been modified. With the inotify watcher running, the
+        result is reused until the watcher reports a write.
         Returns a dictionary with current UPS status, including SoC and raw values.
         """
-        if self.db_manager.connection is None:
+        expires_at, cached_stamp, cached_data = self._ups_cache
+        if cached_data is not None:
+            if time.monotonic() < expires_at:
+                return dict(cached_data)
+            if self._ups_watch_ok and cached_stamp == self._ups_generation:
+                return dict(cached_data)
+
+        with self._ups_cond:
+            # Concurrent callers share the refresh already in flight instead of repeating it
+            while self._ups_refreshing:
+                self._ups_cond.wait()
+            expires_at, cached_stamp, cached_data = self._ups_cache
+            if cached_data is not None and time.monotonic() < expires_at:
+                return dict(cached_data)
+            self._ups_refreshing = True
+
+        try:
+            stamp = self._ups_db_stamp()
+            if cached_data is not None and stamp is not None and stamp == cached_stamp:
+                # No new metric can have been written; extend the cached result
+                ups_data = cached_data
+            else:
+                ups_data = self._read_ups_data()
+            self._ups_cache = (time.monotonic() + UPS_DATA_TTL_SECONDS, stamp, ups_data)
+        finally:
+            with self._ups_cond:
+                self._ups_refreshing = False
+                self._ups_cond.notify_all()
+        return dict(ups_data)
+
+    def _ups_db_stamp(self):
+        """
+        Returns a value that changes whenever a metric row is committed: the
+        watcher's write generation, or else the modification times of the
+        database and its WAL file. Returns None if unavailable.
+        """
+        if self._ups_watch_ok:
+            return self._ups_generation
+        try:
+            db_mtime = os.stat(DEFAULT_PI_BACKEND_DB_PATH).st_mtime_ns
+        except OSError:
+            return None
+        try:
+            wal_mtime = os.stat(DEFAULT_PI_BACKEND_DB_PATH + "-wal").st_mtime_ns
+        except OSError:
+            wal_mtime = None
+        return (db_mtime, wal_mtime)
+
+    def _start_ups_watcher(self):
+        """Starts the inotify thread that watches the database for UPS writes, if possible."""
+        if not INOTIFY_AVAILABLE:
+            return None
+        try:
+            inotify = INotify()
+            inotify.add_watch(os.path.dirname(DEFAULT_PI_BACKEND_DB_PATH),
+                              inotify_flags.MODIFY | inotify_flags.CLOSE_WRITE | inotify_flags.MOVED_TO)
+        except OSError as e:
+            logging.warning(f"HardwareManager: Could not watch the database for UPS updates: {e}")
+            return None
+        watcher = threading.Thread(target=self._ups_watch_thread, args=(inotify,), daemon=True)
+        self._ups_watch_ok = True
+        watcher.start()
+        return watcher
+
+    def _ups_watch_thread(self, inotify):
+        """A background thread that bumps the UPS cache generation on database writes."""
+        db_name = os.path.basename(DEFAULT_PI_BACKEND_DB_PATH)
+        watched_names = (db_name, db_name + "-wal")
+        try:
+            while not self._stop_ups_watch.is_set():
+                for event in inotify.read(timeout=UPS_WATCH_POLL_MS):
+                    if event.name in watched_names:
+                        self._ups_generation += 1
+                        break
+        except Exception as e:
+            logging.error(f"UPS Watch Thread: Error occurred: {e}. Falling back to stat polling.", exc_info=True)
+        finally:
+            inotify.close()
+            # Without the watcher, get_ups_data goes back to comparing file modification times
+            self._ups_watch_ok = False
+
+    def _open_ups_connection(self):
+        """
+        Opens the long-lived connection used for UPS reads. Only per-connection
+        pragmas are set: the journal mode is persistent and shared by every
+        process using pi_backend.db, so it is left to the database owner.
+        Returns (connection, cursor), or (None, None) on failure.
+        """
+        try:
+            conn = sqlite3.connect(DEFAULT_PI_BACKEND_DB_PATH, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+        except sqlite3.Error as e:
+            logging.error(f"HardwareManager: Error connecting to database for UPS data: {e}")
+            return None, None
+        try:
+            conn.execute("PRAGMA synchronous=NORMAL;")
+            conn.execute(f"PRAGMA mmap_size={UPS_DB_MMAP_SIZE};")
+        except sqlite3.Error as e:
+            logging.warning(f"HardwareManager: Could not apply UPS connection pragmas: {e}")
+        return conn, conn.cursor()
+
+    def _read_ups_data(self):
+        """Reads and formats the latest UPS metric row from the main database."""
+        if self._ups_cursor is None:
             return {"error": "Database not connected. Cannot retrieve UPS data.", "status": "error"}
         
         try:
-            latest_metric = self.db_manager.get_latest_ups_metric()
+            # Only the single-flight refresh in get_ups_data calls this, so the cursor is never shared
+            row = self._ups_cursor.execute(UPS_LATEST_METRIC_QUERY).fetchone()
+            latest_metric = dict(row) if row else None
             
             if latest_metric:
                 # The ups_metrics table stores battery_percentage and remaining_mah directly
@@ -201,66 +693,113 @@ class HardwareManager:
 
 
     # --- GNSS (GPS) Methods ---
+    def get_gnss_snapshot(self):
+        """
+        Returns the latest GNSS fix as a `GnssSnapshot`, or None if gpsd is
+        unreachable or the data is stale. Cheaper than `get_best_gnss_data`
+        for in-process callers that only need a few fields.
+        """
+        if not self._gps_available:
+            return None
+        # Snapshots are never mutated after publication, so one reference read is enough
+        tpv, sky, last_update = self._gps_snapshot
+        # Check for stale data if last_update is older than 10 seconds
+        if time.time() - last_update > 10:
+            return None
+
+        # gpsd modes are 0-3; a malformed report may carry anything, and a negative
+        # index would silently pick a label from the end of the tuple
+        mode = tpv.mode
+        if isinstance(mode, int) and 0 <= mode < len(_FIX_TYPE_NAMES):
+            fix_type = _FIX_TYPE_NAMES[mode]
+        else:
+            fix_type = "Unknown"
+        return GnssSnapshot(tpv, sky, fix_type)
+
     def get_best_gnss_data(self):
         """Retrieves the latest GNSS data directly from the real-time cache."""
-        with self._gps_lock:
-            # Check for stale data if last_update is older than 10 seconds
-            if time.time() - self._latest_gps_data.get("last_update", 0) > 10:
-                return {"error": "Stale GPS data. `gpspipe` stream may be down or no fix.", "fix_type": "No Fix"}
-            tpv_data = self._latest_gps_data.get("TPV", {})
-            sky_data = self._latest_gps_data.get("SKY", {})
-
-        fix_mode = tpv_data.get('mode', 0)
-        fix_type_map = {0: 'No Fix', 1: 'No Fix', 2: '2D Fix', 3: '3D Fix'}
-
-        altitude = tpv_data.get('altHAE')
-        if altitude is None:
-            altitude = tpv_data.get('altMSL')
-        if altitude is None:
-            altitude = tpv_data.get('alt')
-
-        return {
-            "source": "Realtime gpspipe Stream",
-            "fix_type": fix_type_map.get(fix_mode, "Unknown"),
-            "latitude": tpv_data.get('lat'),
-            "longitude": tpv_data.get('lon'),
-            "altitude_m": altitude,
-            "speed_mps": tpv_data.get('speed'),
-            "track_deg": tpv_data.get('track'),
-            "climb_mps": tpv_data.get('climb'),
-            "time_utc": tpv_data.get('time'),
-            "satellites_used": sky_data.get('uSat', 0),
-            "satellites_in_view": sky_data.get('nSat', 0),
-            "error_horizontal_m": tpv_data.get('epx'),
-            "error_vertical_m": tpv_data.get('epv'),
-        }
+        snapshot = self.get_gnss_snapshot()
+        if snapshot is None:
+            if not self._gps_available:
+                return dict(_GPS_UNAVAILABLE_RESPONSE)
+            return {"error": "Stale GPS data. gpsd stream may be down or no fix.", "fix_type": "No Fix"}
+        return snapshot.to_dict()
 
     def get_raw_gps_cache(self):
         """Returns a copy of the internal raw GPS data cache for debugging."""
-        with self._gps_lock:
-            return self._latest_gps_data.copy()
+        tpv, sky, last_update = self._gps_snapshot
+        return {"TPV": dict(tpv.raw), "SKY": dict(sky.raw), "last_update": last_update}
+
+    def _open_systemd_bus(self):
+        """Opens the shared system D-Bus connection used for unit state queries, if possible."""
+        if not PYSTEMD_AVAILABLE:
+            return None
+        try:
+            bus = DBus()
+            bus.open()
+            return bus
+        except Exception as e:
+            logging.warning(f"HardwareManager: Could not connect to systemd over D-Bus, using systemctl instead: {e}")
+            return None
+
+    def _unit_active_state(self, unit_name):
+        """Returns a unit's ActiveState (e.g. 'active') via D-Bus, or None if D-Bus is unavailable."""
+        if self._systemd_bus is None:
+            return None
+        try:
+            with self._systemd_lock:
+                unit = SystemdUnit(unit_name.encode(), bus=self._systemd_bus, _autoload=True)
+                return unit.Unit.ActiveState.decode()
+        except Exception as e:
+            logging.debug(f"HardwareManager: D-Bus state query for {unit_name} failed: {e}")
+            return None
 
     def get_gpsd_status(self):
-        """Checks the status of core GPS-related services."""
+        """Checks the status of core GPS-related services, reusing results for a few seconds."""
+        expires_at, cached_report = self._gpsd_status_cache
+        if cached_report is not None and time.monotonic() < expires_at:
+            return dict(cached_report)
+
         services = ["gpsd.service", "a7670e-gps-init.service"]
         status_report = {}
+        unresolved = []
         for service in services:
+            state = self._unit_active_state(service)
+            if state is not None:
+                status_report[service] = state
+            else:
+                unresolved.append(service)
+        if unresolved:
+            # `systemctl is-active` takes several units and prints one state per line,
+            # so the remaining services cost a single process
             try:
-                result = subprocess.run(['systemctl', 'is-active', service], capture_output=True, text=True)
-                status_report[service] = result.stdout.strip()
+                result = subprocess.run(['systemctl', 'is-active', *unresolved], capture_output=True)
+                states = result.stdout.decode('utf-8', 'replace').splitlines()
+                for service, state in zip(unresolved, states):
+                    status_report[service] = state.strip()
+                for service in unresolved[len(states):]:
+                    status_report[service] = "unknown"
             except Exception as e:
-                 status_report[service] = f"error: {e}"
-        return status_report
+                for service in unresolved:
+                    status_report[service] = f"error: {e}"
+        self._gpsd_status_cache = (time.monotonic() + self._service_status_ttl, status_report)
+        return dict(status_report)
 
     # --- LTE Methods ---
     def get_lte_network_info(self):
         """Gets detailed network information from the LTE modem."""
         lte_manager = self.get_manager("LTE Modem (A7670E)")
         if not lte_manager: return {"error": "LTE Modem module not loaded or failed to initialize."}
+        # One port lease for all three queries instead of a gpsd stop/start each
+        signal_quality, network_registration, operator_info = lte_manager.send_at_batch([
+            ("AT+CSQ", "+CSQ:"),
+            ("AT+CREG?", "+CREG:"),
+            ("AT+COPS?", "+COPS:"),
+        ])
         return {
-            "signal_quality": lte_manager.send_at_command("AT+CSQ", "+CSQ:"),
-            "network_registration": lte_manager.send_at_command("AT+CREG?", "+CREG:"),
-            "operator_info": lte_manager.send_at_command("AT+COPS?", "+COPS:")
+            "signal_quality": signal_quality,
+            "network_registration": network_registration,
+            "operator_info": operator_info
         }
 
     def set_lte_flight_mode(self, enable: bool):
@@ -293,8 +832,16 @@ class HardwareManager:
         """Stops threads and closes connections for all loaded hardware modules."""
         logging.info("HardwareManager: Closing all hardware and stopping threads.")
         self._stop_gps_thread.set()
+        try:
+            # Wake the parser now rather than at its next queue timeout; if the queue
+            # is full the parser is busy and will see the stop flag on its next pass
+            self._gps_raw_queue.put_nowait(None)
+        except queue.Full:
+            pass
         if self._gps_thread.is_alive():
             self._gps_thread.join(timeout=2)
+        if self._gps_parse_thread.is_alive():
+            self._gps_parse_thread.join(timeout=2)
 
         for name, manager_instance in self._loaded_modules.items():
             if hasattr(manager_instance, 'close'):
@@ -304,3 +851,12 @@ class HardwareManager:
                 except Exception as e:
                     logging.error(f"Error closing {name}: {e}")
 
+        self._stop_ups_watch.set()
+        watcher = self._ups_watcher
+        if watcher is not None and watcher.is_alive():
+            watcher.join(timeout=2)
+
+        if self._ups_conn:
+            self._ups_conn.close()
+            self._ups_conn, self._ups_cursor = None, None
+
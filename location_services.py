@@ -1,18 +1,48 @@
 #
 # File: location_services.py
-# Version: 2.1.2 (Fix Application Context)
+# Version: 2.3.0 (Geocoding Performance)
 #
 # Description: Handles geocoding from location strings to coordinates.
 #
-# Changelog (v2.1.2):
-# - FIX: Modified `get_location_details` and `reverse_geocode_from_coords`
-#   to explicitly accept `db_manager` and `config_manager` instances instead
-#   of relying on `current_app`. This resolves "Working outside of application context"
-#   errors when called from contexts like the data poller service.
-# - REFACTOR: Updated `set_hardware_manager` to allow the Flask app to inject
-#   the `HardwareManager` instance, ensuring consistency.
+# Changelog (v2.3.0):
+# - PERF: `GoogleV3` geocoders are created once per API key and reused, so
+#   geocoding requests share pooled HTTP connections instead of opening a new
+#   TLS session per call.
+# - PERF: Geocoding results are cached in the `geocode_cache` database table
+#   for `[Location] Geocode_Cache_TTL_Seconds` (default 30 days) instead of an
+#   in-process dict that was lost on every restart. Reverse lookups are cached
+#   too.
+# - PERF: Cache keys are normalized: queries are lower-cased with whitespace and
+#   comma spacing collapsed, and reverse lookups round coordinates to 4
+#   decimals (~11 m), so equivalent requests hit the same entry.
+# - PERF: Geocoder calls use a 5s timeout (`[Location] Geocode_Timeout_Seconds`)
+#   instead of 10s and retry timeouts and transient service errors up to
+#   `GEOCODE_MAX_ATTEMPTS` times with exponential backoff.
+# - PERF: Empty results and rejected queries are cached as negative entries
+#   for `GEOCODE_NEGATIVE_TTL_SECONDS` (5 minutes), so unresolvable input does
+#   not call the Google API on every request. Timeouts, service errors and key
+#   failures are not cached.
+# - PERF: The geocode cache is bounded to `GEOCODE_CACHE_MAX_ENTRIES` rows;
+#   storing a new result evicts the least recently fetched ones, so a
+#   long-running poller geocoding many distinct strings cannot grow it forever.
+# - PERF: `reverse_geocode_from_coords` consults the cache (keyed on the
+#   `REVERSE_GEOCODE_GRID_DECIMALS` coordinate grid) before looking up the API
+#   key, so a stationary or slowly moving device is answered with one query.
+# - FIX: The warning printed when no `HardwareManager` was injected goes to
+#   stderr like the module's other messages; it called the never-imported
+#   `logging` module.
 #
 # DEV_NOTES:
+# - v2.2.0:
+#   - PERF: The GNSS fallback in `get_location_details` reads the position from
+#     `HardwareManager.get_gnss_snapshot` instead of the full GNSS response dict.
+# - v2.1.2:
+#   - FIX: Modified `get_location_details` and `reverse_geocode_from_coords`
+#     to explicitly accept `db_manager` and `config_manager` instances instead
+#     of relying on `current_app`. This resolves "Working outside of application context"
+#     errors when called from contexts like the data poller service.
+#   - REFACTOR: Updated `set_hardware_manager` to allow the Flask app to inject
+#     the `HardwareManager` instance, ensuring consistency.
 # - v2.1.1:
 #   - CRITICAL FIX: Solved "Working outside of application context" error.
 #     The database manager is now correctly accessed from `current_app`
@@ -21,101 +51,202 @@
 #   - REFACTOR: Switched to fetching API keys from the database.
 #
 import sys
+import re
 import time
 # Removed flask's current_app import as it will be passed explicitly
 from hardware_manager import HardwareManager # Keep import for type hinting/dependency understanding
 
 try:
     from geopy.geocoders import GoogleV3
-    from geopy.exc import GeocoderTimedOut, GeocoderServiceError
+    from geopy.exc import GeocoderTimedOut, GeocoderServiceError, GeocoderQueryError, GeocoderAuthenticationFailure
     GEOPY_AVAILABLE = True
 except ImportError:
     GEOPY_AVAILABLE = False
     print("[WARN] geopy library not found. Geocoding features will be disabled.", file=sys.stderr)
 
-__version__ = "2.1.2"
-
-_location_cache = {}
-CACHE_EXPIRY_SECONDS = 3600
+__version__ = "2.3.0"
+
+# Per-request geocoder timeout; see [Location] Geocode_Timeout_Seconds
+GEOCODE_TIMEOUT_SECONDS = 5
+# Attempts per geocode on timeouts and transient service errors, with exponential backoff
+GEOCODE_MAX_ATTEMPTS = 3
+# Default lifetime of cached geocoding results (30 days); see [Location] Geocode_Cache_TTL_Seconds
+GEOCODE_CACHE_TTL_SECONDS = 30 * 24 * 3600
+# Lifetime of cached empty/rejected results, so unresolvable queries are not re-sent to Google on every request
+GEOCODE_NEGATIVE_TTL_SECONDS = 300
+# Most rows kept in the geocode cache; the least recently fetched are evicted beyond this
+GEOCODE_CACHE_MAX_ENTRIES = 2048
+# Reverse lookups are cached per grid cell of this many decimals (4 ~= 11 m), absorbing GPS jitter
+REVERSE_GEOCODE_GRID_DECIMALS = 4
 
 _hw_manager_instance = None 
 
+# One geocoder per API key. geopy's default adapter keeps a requests.Session per geocoder,
+# so reusing the instance reuses pooled TCP/TLS connections to the Google API.
+_geolocator_by_key = {}
+
 def set_hardware_manager(hw_manager_instance):
     """Allows external injection of HardwareManager instance into this module."""
     global _hw_manager_instance
     _hw_manager_instance = hw_manager_instance
 
-def _get_from_cache(key):
-    if key in _location_cache and (time.time() - _location_cache[key][0]) < CACHE_EXPIRY_SECONDS:
-        return _location_cache[key][1]
+def _get_geolocator(api_key):
+    """Returns the shared GoogleV3 geocoder for `api_key`, creating it on first use."""
+    geolocator = _geolocator_by_key.get(api_key)
+    if geolocator is None:
+        geolocator = _geolocator_by_key[api_key] = GoogleV3(api_key=api_key)
+    return geolocator
+
+def _cache_ttl(config_manager):
+    """Returns the configured geocode cache lifetime in seconds."""
+    if config_manager is None:
+        return GEOCODE_CACHE_TTL_SECONDS
+    return config_manager.getint('Location', 'Geocode_Cache_TTL_Seconds', fallback=GEOCODE_CACHE_TTL_SECONDS)
+
+_SEPARATOR_RE = re.compile(r'\s*,\s*')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+def _geocode_timeout(config_manager):
+    """Returns the configured per-request geocoder timeout in seconds."""
+    if config_manager is None:
+        return GEOCODE_TIMEOUT_SECONDS
+    return config_manager.getfloat('Location', 'Geocode_Timeout_Seconds', fallback=GEOCODE_TIMEOUT_SECONDS)
+
+def _call_with_retry(func, *args, **kwargs):
+    """
+    Calls a geocoder method, retrying timeouts and transient service errors up
+    to GEOCODE_MAX_ATTEMPTS times. Bad queries and rejected keys are not retried.
+    """
+    for attempt in range(GEOCODE_MAX_ATTEMPTS):
+        try:
+            return func(*args, **kwargs)
+        except (GeocoderQueryError, GeocoderAuthenticationFailure):
+            raise
+        except (GeocoderTimedOut, GeocoderServiceError) as e:
+            if attempt == GEOCODE_MAX_ATTEMPTS - 1:
+                raise
+            delay = 0.25 * 2 ** attempt
+            print(f"[WARN] Geocoding attempt {attempt + 1} failed: {e}. Retrying in {delay}s.", file=sys.stderr)
+            time.sleep(delay)
+
+def _query_cache_key(location_query):
+    """Canonicalizes a query so case, spacing and comma-spacing variants share a cache entry."""
+    key = _SEPARATOR_RE.sub(', ', location_query.strip().lower())
+    return _WHITESPACE_RE.sub(' ', key)
+
+def _coords_cache_key(lat, lon):
+    """Snaps to the reverse-geocode grid, so nearby GPS fixes share one cache entry."""
+    return f"{float(lat):.{REVERSE_GEOCODE_GRID_DECIMALS}f},{float(lon):.{REVERSE_GEOCODE_GRID_DECIMALS}f}"
+
+def _get_from_cache(db_manager, key, ttl):
+    """
+    Returns the cached geocode_cache row for `key` if it is younger than `ttl`,
+    else None. Negative entries (latitude None) only live GEOCODE_NEGATIVE_TTL_SECONDS.
+    """
+    return db_manager.get_geocode(key, ttl, min(ttl, GEOCODE_NEGATIVE_TTL_SECONDS))
+
+def _set_in_cache(db_manager, key, latitude, longitude, address=None, raw=None):
+    db_manager.set_geocode(key, latitude, longitude, address, raw, max_entries=GEOCODE_CACHE_MAX_ENTRIES)
+
+def _forward_result(location_query, latitude, longitude, address):
+    """Builds the (lat, lon, details) tuple returned for a successful forward geocode."""
+    return (latitude, longitude, {
+        "source": "Google Geocoding", "query": location_query,
+        "address": address, "latitude": latitude,
+        "longitude": longitude
+    })
+
+def _geocode_and_cache(geocode, location_query, cache_key, db_manager, config_manager):
+    """
+    Geocodes `location_query` with `geocode` and records the outcome in the cache.
+    Returns the result tuple, or None if nothing was found or the call failed.
+    """
+    try:
+        location = _call_with_retry(geocode, location_query, timeout=_geocode_timeout(config_manager))
+        if location:
+            _set_in_cache(db_manager, cache_key, location.latitude, location.longitude,
+                          location.address, location.raw)
+            return _forward_result(location_query, location.latitude, location.longitude, location.address)
+        _set_in_cache(db_manager, cache_key, None, None, raw={"error": "No results.", "negative": True})
+    except GeocoderQueryError as e:
+        # The query itself was rejected; retrying it within the negative TTL cannot succeed
+        print(f"[ERROR] Geocoding query rejected: {e}. Falling back.", file=sys.stderr)
+        _set_in_cache(db_manager, cache_key, None, None, raw={"error": str(e), "negative": True})
+    except Exception as e:
+        # Timeouts, outages and key problems are transient; the next request tries again
+        print(f"[ERROR] Geocoding service error: {e}. Falling back.", file=sys.stderr)
     return None
 
-def _set_in_cache(key, data):
-    _location_cache[key] = (time.time(), data)
-
 # Updated to accept db_manager and config_manager explicitly
 def get_location_details(location_query=None, db_manager=None, config_manager=None):
     if db_manager is None or config_manager is None:
         return (None, None, {"error": "Database/Config Manager not provided to location_services.get_location_details."})
 
     # Use the globally injected HardwareManager instance
-    hw_manager_to_use = _hw_manager_instance 
+    hw_manager_to_use = _hw_manager_instance
     if hw_manager_to_use is None:
-        # Fallback if not injected, but this indicates a setup issue in calling code
-        # Attempt to create a new one, though this might lead to multiple instances
-        # and not ideal for long-running processes like data_poller.
-        logging.warning("location_services: HardwareManager not injected. Attempting to create new instance.")
-        hw_manager_to_use = HardwareManager(app_config=config_manager) # Pass config_manager to new instance
+        # Not injected by the caller. HardwareManager is a singleton, so this returns
+        # the process's existing instance (or creates it) rather than a second one.
+        print("[WARN] location_services: HardwareManager not injected. Using the shared instance.", file=sys.stderr)
+        hw_manager_to_use = HardwareManager(app_config=config_manager)
 
     if location_query:
-        cached_location = _get_from_cache(location_query)
-        if cached_location:
-            return cached_location
+        cache_key = _query_cache_key(location_query)
+        cached = _get_from_cache(db_manager, cache_key, _cache_ttl(config_manager))
+        if cached and cached['latitude'] is not None:
+            return _forward_result(location_query, cached['latitude'], cached['longitude'], cached['address'])
 
-        if GEOPY_AVAILABLE:
+        # A cached negative result means this query recently failed; skip to the GNSS fallback
+        if GEOPY_AVAILABLE and not cached:
             api_key = db_manager.get_key_value_by_name('GOOGLE_GEOCODING_API_KEY')
 
             if api_key:
-                try:
-                    geolocator = GoogleV3(api_key=api_key)
-                    location = geolocator.geocode(location_query, timeout=10)
-                    if location:
-                        result = (location.latitude, location.longitude, {
-                            "source": "Google Geocoding", "query": location_query,
-                            "address": location.address, "latitude": location.latitude,
-                            "longitude": location.longitude
-                        })
-                        _set_in_cache(location_query, result)
-                        return result
-                except Exception as e:
-                    print(f"[ERROR] Geocoding service error: {e}. Falling back.", file=sys.stderr)
+                result = _geocode_and_cache(_get_geolocator(api_key).geocode, location_query, cache_key,
+                                            db_manager, config_manager)
+                if result:
+                    return result
             else:
                 print("[WARN] GOOGLE_GEOCODING_API_KEY not found in database. Geocoding disabled.", file=sys.stderr)
 
     # Fallback to GNSS
     if hw_manager_to_use:
-        gps_data = hw_manager_to_use.get_best_gnss_data()
-        if gps_data and "error" not in gps_data and gps_data.get('latitude') is not None:
-            lat, lon = gps_data['latitude'], gps_data['longitude']
+        gnss = hw_manager_to_use.get_gnss_snapshot()
+        if gnss is not None and gnss.latitude is not None:
+            lat, lon = gnss.latitude, gnss.longitude
             return (float(lat), float(lon), {"source": "Onboard GNSS", "latitude": float(lat), "longitude": float(lon)})
 
     return (None, None, {"error": "Failed to resolve location from any source."})
 
 # Updated to accept db_manager explicitly
-def reverse_geocode_from_coords(lat, lon, db_manager):
+def reverse_geocode_from_coords(lat, lon, db_manager, config_manager=None):
     if not GEOPY_AVAILABLE:
         return {"error": "geopy library not available."}
     if db_manager is None:
         return {"error": "Database Manager not provided for reverse geocoding."}
 
+    # Cache first: jittery fixes within one grid cell never need the API key or a paid call
+    cache_key = _coords_cache_key(lat, lon)
+    cached = _get_from_cache(db_manager, cache_key, _cache_ttl(config_manager))
+    if cached and cached['latitude'] is None:
+        return {"error": "No address found."}
+    if cached:
+        return {"address": cached['address'], "raw": cached['raw_json']}
+
     api_key = db_manager.get_key_value_by_name('GOOGLE_GEOCODING_API_KEY')
 
     if not api_key:
         return {"error": "GOOGLE_GEOCODING_API_KEY not found in database."}
 
     try:
-        geolocator = GoogleV3(api_key=api_key)
-        location = geolocator.reverse((lat, lon), exactly_one=True, timeout=10)
-        return {"address": location.address, "raw": location.raw} if location else {"error": "No address found."}
+        geolocator = _get_geolocator(api_key)
+        location = _call_with_retry(geolocator.reverse, (lat, lon), timeout=_geocode_timeout(config_manager))
+        if not location:
+            _set_in_cache(db_manager, cache_key, None, None, raw={"error": "No results.", "negative": True})
+            return {"error": "No address found."}
+        _set_in_cache(db_manager, cache_key, lat, lon, location.address, location.raw)
+        return {"address": location.address, "raw": location.raw}
+    except GeocoderQueryError as e:
+        _set_in_cache(db_manager, cache_key, None, None, raw={"error": str(e), "negative": True})
+        return {"error": f"Reverse geocoding error: {e}"}
     except Exception as e:
         return {"error": f"Reverse geocoding error: {e}"}
@@ -1,20 +1,59 @@
 # pi_backend/modules/A7670E.py
-# Version: 2.2.0 (Conflict-Free)
+# Version: 2.3.0 (AT Command Performance)
 #
 # Description: A class to interact with the A7670E cellular module.
 #
-# Changelog (v2.2.0):
-# - FIX: CRITICAL: Removed the automatic serial port opening from __init__.
-#   This was causing a "Device or resource busy" error because the gpsd
-#   service already has control of /dev/serial0. This module will now
-#   be used for AT command formatting, but the actual sending of commands
-#   must be handled by a dedicated function that can manage the serial port
-#   without conflicting with gpsd. This change prevents the API from crashing.
+# Changelog (v2.3.0):
+# - PERF: `send_at_command` reads whatever the UART has buffered in one
+#   `read()` and splits lines out of a local buffer, instead of `readline()`
+#   issuing a read per byte.
+# - PERF: Added reference-counted `acquire()`/`release()` and `send_at_batch()`
+#   so several AT commands share one gpsd stop/start instead of paying the
+#   systemd round trip (plus the 1 s settle delay) per command.
+# - PERF: gpsd is stopped/started with systemd `StopUnit`/`StartUnit` calls
+#   over D-Bus when `pystemd` is installed, instead of forking `sudo
+#   systemctl`. Like `systemctl`, the call waits (up to
+#   `GPSD_JOB_TIMEOUT_SECONDS`) until the units reach inactive/active, and a
+#   failed or timed-out stop raises when `check=True`. Pass `use_dbus=False`,
+#   or lack pystemd or permission, to keep the `sudo systemctl` path.
+# - PERF: Response lines are matched against `expected_response` as bytes and
+#   only decoded when returned (or when DEBUG logging is on), instead of
+#   decoding every line the modem sends.
+#
+# DEV_NOTES:
+# - v2.2.0:
+#   - FIX: CRITICAL: Removed the automatic serial port opening from __init__.
+#     This was causing a "Device or resource busy" error because the gpsd
+#     service already has control of /dev/serial0. This module will now
+#     be used for AT command formatting, but the actual sending of commands
+#     must be handled by a dedicated function that can manage the serial port
+#     without conflicting with gpsd. This change prevents the API from crashing.
 #
 import serial
 import time
 import logging
 import subprocess # Added missing import
+import threading
+
+# pystemd talks to systemd over D-Bus, avoiding a sudo + systemctl fork per gpsd stop/start
+try:
+    from pystemd.dbuslib import DBus
+    from pystemd.systemd1 import Manager as SystemdManager
+    from pystemd.systemd1 import Unit as SystemdUnit
+    PYSTEMD_AVAILABLE = True
+except ImportError:
+    PYSTEMD_AVAILABLE = False
+
+# Units that hold /dev/serial0 and must be stopped while the modem is in use
+GPSD_UNITS = ('gpsd.socket', 'gpsd.service')
+
+# StopUnit/StartUnit only queue a job; how long to wait for gpsd to actually settle
+GPSD_JOB_TIMEOUT_SECONDS = 10
+# How often the unit's ActiveState is polled while waiting
+GPSD_JOB_POLL_SECONDS = 0.05
+
+# Longest single blocking read while waiting for a response, so the timeout is honoured
+AT_READ_POLL_SECONDS = 0.1
 
 class A7670E:
     """
@@ -22,16 +61,86 @@ class A7670E:
     This version does not automatically open a serial port to avoid
     conflicts with other services like gpsd.
     """
-    def __init__(self, port='/dev/serial0', baudrate=115200, timeout=1):
+    def __init__(self, port='/dev/serial0', baudrate=115200, timeout=1, use_dbus=True):
         """
         Initializes the A7670E handler. Does NOT open a serial port.
+        With use_dbus, gpsd is controlled over D-Bus when pystemd is available.
         """
         self.port = port
         self.baudrate = baudrate
         self.timeout = timeout
         self.ser = None
+        # Serialises port users; re-entrant so a batch can nest single commands
+        self._port_lock = threading.RLock()
+        self._lease_count = 0
+        self._systemd_bus = None
+        self._systemd_units = {}
+        self._systemd_manager = self._open_systemd_manager() if use_dbus else None
         logging.info("A7670E Handler Initialized (Serial port connection deferred).")
 
+    def _open_systemd_manager(self):
+        """Connects to the systemd manager over the system D-Bus, or returns None."""
+        if not PYSTEMD_AVAILABLE:
+            return None
+        try:
+            bus = DBus()
+            bus.open()
+            manager = SystemdManager(bus=bus, _autoload=True)
+            self._systemd_bus = bus
+            return manager
+        except Exception as e:
+            logging.warning(f"A7670E: Could not connect to systemd over D-Bus, using sudo systemctl instead: {e}")
+            return None
+
+    def _control_gpsd(self, action, check=False):
+        """Stops or starts the gpsd units ('stop'/'start'), over D-Bus when possible."""
+        if self._systemd_manager is not None:
+            try:
+                manager = self._systemd_manager.Manager
+                method = manager.StopUnit if action == 'stop' else manager.StartUnit
+                for unit in GPSD_UNITS:
+                    method(unit.encode(), b'replace')
+            except Exception as e:
+                # Typically a polkit denial for a non-root user; sudo may still be allowed
+                logging.warning(f"A7670E: D-Bus {action} of gpsd failed, falling back to sudo systemctl: {e}")
+            else:
+                # Like `systemctl`, don't return until the jobs have finished, so the
+                # port is only opened once gpsd has really let go of it.
+                error = self._wait_for_gpsd(action)
+                if error:
+                    if check:
+                        raise RuntimeError(error)
+                    logging.warning(f"A7670E: {error}")
+                return
+        # Capture output to prevent it from interfering with API response
+        subprocess.run(['sudo', 'systemctl', action, *GPSD_UNITS], check=check, capture_output=True, text=True)
+
+    def _wait_for_gpsd(self, action):
+        """
+        Polls the gpsd units' ActiveState until the queued stop/start job is done.
+        Returns None on success, or an error message if a unit failed or timed out.
+        """
+        target = b'inactive' if action == 'stop' else b'active'
+        deadline = time.monotonic() + GPSD_JOB_TIMEOUT_SECONDS
+        for name in GPSD_UNITS:
+            try:
+                unit = self._systemd_units.get(name)
+                if unit is None:
+                    unit = SystemdUnit(name.encode(), bus=self._systemd_bus, _autoload=True)
+                    self._systemd_units[name] = unit
+                while True:
+                    state = unit.Unit.ActiveState
+                    if state == target:
+                        break
+                    if state == b'failed':
+                        return f"{name} failed to {action}."
+                    if time.monotonic() >= deadline:
+                        return f"Timed out waiting for {name} to {action} (state: {state.decode()})."
+                    time.sleep(GPSD_JOB_POLL_SECONDS)
+            except Exception as e:
+                return f"Could not read the state of {name}: {e}"
+        return None
+
     def _get_serial_connection(self):
         """
         Gets a temporary, exclusive serial connection.
@@ -43,16 +152,14 @@ class A7670E:
         # if gpsd is active, but it won't crash the app on startup.
         try:
             # Temporarily stop gpsd to free the port
-            # Capture output to prevent it from interfering with API response
-            subprocess.run(['sudo', 'systemctl', 'stop', 'gpsd.socket', 'gpsd.service'], check=True, capture_output=True, text=True) # Modified
+            self._control_gpsd('stop', check=True)
             time.sleep(1) # Give time for the port to be released
             self.ser = serial.Serial(self.port, self.baudrate, timeout=self.timeout)
             return True
         except Exception as e:
             logging.error(f"Failed to acquire serial port {self.port}: {e}")
             # Restart gpsd since we failed
-            # Capture output to prevent it from interfering with API response
-            subprocess.run(['sudo', 'systemctl', 'start', 'gpsd.socket', 'gpsd.service'], capture_output=True, text=True) # Modified
+            self._control_gpsd('start')
             return False
 
     def _release_serial_connection(self):
@@ -61,45 +168,115 @@ class A7670E:
             self.ser.close()
         self.ser = None
         # Always restart gpsd to return control
-        # Capture output to prevent it from interfering with API response
-        subprocess.run(['sudo', 'systemctl', 'start', 'gpsd.socket', 'gpsd.service'], capture_output=True, text=True) # Modified
+        self._control_gpsd('start')
 
 
+    def acquire(self):
+        """
+        Leases the serial port, stopping gpsd only for the first holder.
+        Every successful call must be paired with `release()`.
+        """
+        with self._port_lock:
+            if self._lease_count == 0 and not self._get_serial_connection():
+                return False
+            self._lease_count += 1
+            return True
+
+    def release(self):
+        """Drops one lease; the last holder closes the port and restarts gpsd."""
+        with self._port_lock:
+            if self._lease_count == 0:
+                return
+            self._lease_count -= 1
+            if self._lease_count == 0:
+                self._release_serial_connection()
+
     def send_at_command(self, command, expected_response, timeout=2):
         """
         Sends an AT command to the module and waits for an expected response.
         Manages acquiring and releasing the serial port around the command.
         """
-        if not self._get_serial_connection():
-            return f"Error: Could not acquire serial port '{self.port}'. It may be in use by gpsd."
+        with self._port_lock:
+            if not self.acquire():
+                return f"Error: Could not acquire serial port '{self.port}'. It may be in use by gpsd."
+            try:
+                return self._send_at_command_locked(command, expected_response, timeout)
+            finally:
+                # CRITICAL: Always release the port and restart gpsd
+                self.release()
+
+    def send_at_batch(self, commands, timeout=2):
+        """
+        Sends several (command, expected_response) pairs under a single port
+        lease and returns the responses in order.
+        """
+        with self._port_lock:
+            if not self.acquire():
+                error = f"Error: Could not acquire serial port '{self.port}'. It may be in use by gpsd."
+                return [error] * len(commands)
+            try:
+                return [self._send_at_command_locked(command, expected_response, timeout)
+                        for command, expected_response in commands]
+            finally:
+                self.release()
 
+    def _send_at_command_locked(self, command, expected_response, timeout):
+        """Sends one AT command over the already-leased port."""
+        original_timeout = self.ser.timeout
         try:
             logging.debug(f"AT=> {command}")
             self.ser.reset_input_buffer()
             self.ser.write((command + '\r\n').encode())
             
-            lines = []
-            start_time = time.time()
-            while time.time() - start_time < timeout:
+            expected_bytes = expected_response.encode()
+            debug_enabled = logging.getLogger().isEnabledFor(logging.DEBUG)
+            buffer = bytearray()
+            deadline = time.monotonic() + timeout
+            # Setting pyserial's timeout reconfigures the port (tcsetattr), so it is set
+            # once here and only clamped again for the final, shorter read.
+            read_timeout = AT_READ_POLL_SECONDS
+            self.ser.timeout = read_timeout
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
                 try:
-                    line = self.ser.readline().decode('utf-8', errors='ignore').strip()
-                    if line:
-                        logging.debug(f"AT<= {line}")
-                        lines.append(line)
-                        if expected_response in line:
-                            return line
-                        if 'ERROR' in line:
-                            logging.error(f"AT command '{command}' returned an error.")
-                            return None
+                    if remaining < read_timeout:
+                        read_timeout = remaining
+                        self.ser.timeout = read_timeout
+                    # Take everything already buffered in one read rather than a byte at a time
+                    chunk = self.ser.read(self.ser.in_waiting or 1)
                 except serial.SerialException as e:
                     logging.error(f"Serial error while reading from port {self.port}: {e}")
                     return None
+                if not chunk:
+                    continue
+                buffer += chunk
+
+                end = buffer.find(b'\n')
+                while end >= 0:
+                    line = bytes(buffer[:end]).strip()
+                    del buffer[:end + 1]
+                    if line:
+                        if debug_enabled:
+                            logging.debug(f"AT<= {line.decode('utf-8', errors='ignore')}")
+                        if expected_bytes in line:
+                            return line.decode('utf-8', errors='ignore').strip()
+                        if b'ERROR' in line:
+                            logging.error(f"AT command '{command}' returned an error.")
+                            return None
+                    end = buffer.find(b'\n')
 
             logging.warning(f"Timeout ({timeout}s) waiting for '{expected_response}' after sending '{command}'.")
             return None
+        except serial.SerialException as e:
+            logging.error(f"Serial error while writing to port {self.port}: {e}")
+            return None
         finally:
-            # CRITICAL: Always release the port and restart gpsd
-            self._release_serial_connection()
+            try:
+                self.ser.timeout = original_timeout
+            except serial.SerialException:
+                pass
 
     def close(self):
         """Ensures the serial connection is closed if open."""
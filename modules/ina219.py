@@ -11,18 +11,35 @@ class INA219:
     _REG_CURRENT = 0x04
     _REG_CALIBRATION = 0x05
 
-    def __init__(self, i2c_bus=1, addr=0x42):
+    def __init__(self, i2c_bus=1, addr=0x42, cache_ttl=0.05):
         self.bus = smbus.SMBus(i2c_bus)
         self.addr = addr
+        # register -> (time.monotonic() of the read, value); readings this fresh skip the I2C bus
+        self._cache = {}
+        self._cache_ttl = cache_ttl
         # Set configuration to default
         self.bus.write_i2c_block_data(self.addr, self._REG_CONFIG, [0x01, 0x9F])
         # Calibrate
         self.bus.write_i2c_block_data(self.addr, self._REG_CALIBRATION, [0x00, 0x00])
 
+    def _cached(self, register, read):
+        now = time.monotonic()
+        entry = self._cache.get(register)
+        if entry is not None and now - entry[0] < self._cache_ttl:
+            return entry[1]
+        value = read()
+        self._cache[register] = (now, value)
+        return value
+
     def _read_voltage(self, register):
-        read = self.bus.read_word_data(self.addr, register)
-        swapped = ((read & 0xFF) << 8) | (read >> 8)
-        return (swapped >> 3) * 4
+        return self._cached(register, lambda: self._read_voltage_uncached(register))
+
+    def _read_register(self, register):
+        # The INA219 sends registers MSB first; reading the two bytes directly avoids swapping an SMBus word
+        return int.from_bytes(bytes(self.bus.read_i2c_block_data(self.addr, register, 2)), 'big')
+
+    def _read_voltage_uncached(self, register):
+        return (self._read_register(register) >> 3) * 4
 
     def get_bus_voltage_V(self):
         return self._read_voltage(self._REG_BUSVOLTAGE) * 0.001
@@ -31,11 +48,35 @@ class INA219:
         return self._read_voltage(self._REG_SHUNTVOLTAGE)
 
     def get_current_mA(self):
+        return self._cached(self._REG_CURRENT, self._read_current)
+
+    def read_all(self):
+        """
+        Reads shunt voltage, bus voltage and current back to back and refreshes
+        the cache for all three with one timestamp, so following getter calls in
+        the TTL window stay off the bus. This is three separate 2-byte
+        read_i2c_block_data transactions (plus the calibration write that
+        precedes the current read), not one 8-byte block read: the INA219
+        register pointer does not auto-increment, so a longer block read would
+        just repeat the first register.
+        """
+        now = time.monotonic()
+        shunt_mV = self._read_voltage_uncached(self._REG_SHUNTVOLTAGE)
+        bus_raw = self._read_voltage_uncached(self._REG_BUSVOLTAGE)
+        current_mA = self._read_current()
+        self._cache[self._REG_SHUNTVOLTAGE] = (now, shunt_mV)
+        self._cache[self._REG_BUSVOLTAGE] = (now, bus_raw)
+        self._cache[self._REG_CURRENT] = (now, current_mA)
+        return {
+            "bus_voltage_V": bus_raw * 0.001,
+            "shunt_voltage_mV": shunt_mV,
+            "current_mA": current_mA,
+        }
+
+    def _read_current(self):
         # Sometimes a sharp load will reset the sensor, so we'll be defensive here.
         try:
             self.bus.write_word_data(self.addr, self._REG_CALIBRATION, 0)
-            read = self.bus.read_word_data(self.addr, self._REG_CURRENT)
-            swapped = ((read & 0xFF) << 8) | (read >> 8)
-            return swapped
+            return self._read_register(self._REG_CURRENT)
         except Exception:
-            return 0 # Return 0 if there's an I2C error
\ No newline at end of file
+            return 0 # Return 0 if there's an I2C error
@@ -1,30 +1,58 @@
 #
 # File: sense_hat.py
-# Version: 1.1.0 (Resilient Initialization)
+# Version: 1.2.0 (Polling Performance)
 #
 # Description: This module provides a consolidated driver for the Raspberry Pi
 #              Sense HAT.
 #
-# Changelog (v1.1.0):
-# - FIX: Implemented a resilient initialization pattern. The module now attempts
-#   to re-initialize the SenseHat connection on each command/data request if
-#   it failed on the initial application startup. This resolves race conditions
-#   where the app starts before the OS hardware drivers are ready.
+# Changelog (v1.2.0):
+# - PERF: Sensors are only polled while someone is reading them. After
+#   `SENSOR_IDLE_SECONDS` without a `get_current_state` call the polling thread
+#   sleeps until the next request wakes it, instead of reading every sensor at
+#   5 Hz forever.
+# - PERF: Joystick events are read by a dedicated thread that blocks in
+#   `select()` on the stick's input device, so events arrive within
+#   milliseconds instead of on the 200 ms sensor cadence, and the sensor loop
+#   no longer drains the stick.
+# - PERF: The CPU temperature sysfs file is kept open and re-read with
+#   `seek(0)`, instead of being opened and closed on every sensor poll.
+# - PERF: `set_pixels` passes 64 [R, G, B] entries straight through instead
+#   of copying each into a tuple, and also accepts a flat list of 192 ints,
+#   which is packed to RGB565 with `array` and written to the LED framebuffer
+#   in a single write when the matrix is unrotated.
+# - FIX: `get_current_state` marks readings with `"stale": True` and their age
+#   (`"age_s"`) when the poller has gone `SENSOR_STALE_SECONDS` since its last
+#   wake without refreshing them, so a stuck polling thread no longer serves old
+#   data silently. Idle sleeps are not counted as staleness.
+# - FIX: The polling thread is created before the first hardware check, which
+#   previously referenced it before assignment when the Sense HAT was present.
+# - FIX: Logs through a module logger instead of calling `logging.basicConfig`
+#   at import, which could override the application's logging setup (or be
+#   silently ignored, depending on import order).
+#
+# DEV_NOTES:
+# - v1.1.0:
+#   - FIX: Implemented a resilient initialization pattern. The module now attempts
+#     to re-initialize the SenseHat connection on each command/data request if
+#     it failed on the initial application startup. This resolves race conditions
+#     where the app starts before the OS hardware drivers are ready.
 #
 import sys
 import os
 import time
 import json
 import logging
-from threading import Thread, Event
+import select
+from array import array
+from threading import Thread, Event, Lock
 
 # --- Module-level state ---
 _sense_instance = None
 _sense_hat_initialized = False
 SENSE_HAT_AVAILABLE = False
 
-# Configure logging for this module
-logging.basicConfig(level=logging.INFO, stream=sys.stdout, format='%(asctime)s - %(levelname)s - %(message)s')
+# Module logger; handlers and levels are left to the application
+logger = logging.getLogger(__name__)
 
 def _initialize_sense_hat():
     """
@@ -41,35 +69,50 @@ def _initialize_sense_hat():
         SENSE_HAT_AVAILABLE = True
         try:
             _sense_instance = SenseHat()
-            logging.info("Successfully initialized real Sense HAT hardware.")
+            logger.info("Successfully initialized real Sense HAT hardware.")
             _sense_hat_initialized = True
         except Exception as e:
-            logging.warning(f"Failed to initialize real Sense HAT: {e}. Falling back to emulator for now.")
+            logger.warning(f"Failed to initialize real Sense HAT: {e}. Falling back to emulator for now.")
             try:
                 _sense_instance = SenseHatEmulator()
-                logging.info("Successfully initialized SenseHatEmulator as a fallback.")
+                logger.info("Successfully initialized SenseHatEmulator as a fallback.")
                 _sense_hat_initialized = True
             except Exception as emu_e:
-                 logging.error(f"SenseHatEmulator also failed to initialize: {emu_e}. Sense HAT features disabled.")
+                 logger.error(f"SenseHatEmulator also failed to initialize: {emu_e}. Sense HAT features disabled.")
                  SENSE_HAT_AVAILABLE = False
                  _sense_instance = None
 
     except ImportError:
         SENSE_HAT_AVAILABLE = False
         _sense_instance = None
-        logging.critical("[CRITICAL] Sense HAT library not found. Sense HAT features will be disabled.")
+        logger.critical("[CRITICAL] Sense HAT library not found. Sense HAT features will be disabled.")
     except Exception as e:
         SENSE_HAT_AVAILABLE = False
         _sense_instance = None
-        logging.critical(f"[CRITICAL] Unhandled error during Sense HAT import/initialization: {e}. Features disabled.")
+        logger.critical(f"[CRITICAL] Unhandled error during Sense HAT import/initialization: {e}. Features disabled.")
 
 # Attempt initialization on module load
 _initialize_sense_hat()
 
-__version__ = "1.1.0"
+__version__ = "1.2.0"
 
 # --- Polling Configuration ---
 POLLING_INTERVAL_SECONDS = 0.2
+# Polling stops when get_current_state() has not been called for this long
+SENSOR_IDLE_SECONDS = 5.0
+# How long a request that wakes an idle poller waits for a fresh reading
+SENSOR_WAKE_WAIT_SECONDS = 1.0
+# Readings are reported as stale when the poller has had this long to refresh them
+# (measured from its last wake, since idle gaps are expected) and has not
+SENSOR_STALE_SECONDS = SENSOR_WAKE_WAIT_SECONDS + 3 * POLLING_INTERVAL_SECONDS
+# Upper bound on a joystick select() so the thread notices close() promptly
+JOYSTICK_SELECT_TIMEOUT_SECONDS = 1.0
+# Number of recent joystick events kept in the state
+JOYSTICK_EVENT_HISTORY = 20
+# Flat pixel_list length for set_pixels: 64 pixels x (R, G, B)
+LED_FLAT_FRAME_LENGTH = 64 * 3
+# Source of the CPU temperature used to correct the sensor readings
+CPU_TEMP_PATH = "/sys/class/thermal/thermal_zone0/temp"
 
 class SenseHatManager:
     """
@@ -81,7 +124,6 @@ class SenseHatManager:
         Initializes the Sense HAT manager.
         """
         self.sense = None # Will be set on-demand
-        self._check_and_set_sense_instance()
 
         self._current_state = {
             "sensors": {},
@@ -89,13 +131,23 @@ class SenseHatManager:
             "last_update": 0
         }
         self._polling_stop_event = Event()
+        # Demand tracking: polling runs only while readers keep asking for data
+        self._last_read_request_ts = 0.0
+        self._last_wake_ts = 0.0 # time.time() of the last wake of an idle poller
+        self._wake_event = Event()
+        self._state_updated = Event()
+        # Guards joystick_events, which the joystick thread and the sensor loop both replace
+        self._joystick_lock = Lock()
+        # Opened on first use and re-read with seek(0), the usual sysfs pattern
+        self._cpu_temp_file = None
         self.polling_thread = Thread(target=self._polling_loop, daemon=True)
+        self.joystick_thread = Thread(target=self._joystick_loop, daemon=True)
 
+        self._check_and_set_sense_instance()
         if self.sense:
-            self.polling_thread.start()
-            logging.info("Sense HAT polling thread started.")
+            logger.info("Sense HAT polling thread started.")
         else:
-             logging.error("SenseHatManager initialized but no hardware/emulator is available yet. Will retry on access.")
+             logger.error("SenseHatManager initialized but no hardware/emulator is available yet. Will retry on access.")
 
 
     def _check_and_set_sense_instance(self):
@@ -106,16 +158,19 @@ class SenseHatManager:
                 self.sense = _sense_instance
                 if self.sense:
                     self.sense.clear()
-                    # If the polling thread wasn't running, start it now.
+                    # If the polling threads weren't running, start them now.
                     if not self.polling_thread.is_alive():
                         self.polling_thread.start()
-                        logging.info("Sense HAT connection established and polling thread started.")
+                        self.joystick_thread.start()
+                        logger.info("Sense HAT connection established and polling thread started.")
 
     def _get_cpu_temperature(self):
         """Reads the CPU temperature for calibration."""
         try:
-            with open("/sys/class/thermal/thermal_zone0/temp", "r") as f:
-                return float(f.read()) / 1000.0
+            if self._cpu_temp_file is None:
+                self._cpu_temp_file = open(CPU_TEMP_PATH, "r")
+            self._cpu_temp_file.seek(0)
+            return float(self._cpu_temp_file.read()) / 1000.0
         except Exception:
             return 45.0 # Return a fallback value
 
@@ -128,6 +183,12 @@ class SenseHatManager:
                 self._check_and_set_sense_instance()
                 continue
 
+            if time.monotonic() - self._last_read_request_ts > SENSOR_IDLE_SECONDS:
+                # Nobody is reading; sleep until a request (or close) wakes us
+                self._wake_event.wait()
+                self._wake_event.clear()
+                continue
+
             try:
                 # --- Sensor Polling ---
                 temp_from_humidity = self.sense.get_temperature_from_humidity()
@@ -148,26 +209,49 @@ class SenseHatManager:
                     "accelerometer_raw": {k: round(v, 2) for k, v in self.sense.get_accelerometer_raw().items()},
                 }
                 self._current_state["sensors"] = sensor_data
-
-                # --- Joystick Polling ---
-                joystick_events = [
-                    {"timestamp": event.timestamp, "direction": event.direction, "action": event.action}
-                    for event in self.sense.stick.get_events()
-                ]
-                if joystick_events:
-                    self._current_state["joystick_events"].extend(joystick_events)
-                    self._current_state["joystick_events"] = self._current_state["joystick_events"][-20:]
-
                 self._current_state["last_update"] = time.time()
+                self._state_updated.set()
 
             except Exception as e:
-                logging.error(f"Error in Sense HAT polling loop: {e}", exc_info=True)
+                logger.error(f"Error in Sense HAT polling loop: {e}", exc_info=True)
                 self._current_state["sensors"]["error"] = f"Polling error: {str(e)}"
-                self._current_state["joystick_events"] = []
+                with self._joystick_lock:
+                    self._current_state["joystick_events"] = []
                 self.sense = None # Invalidate sense object on error to force re-init
                 _sense_hat_initialized = False
 
             self._polling_stop_event.wait(POLLING_INTERVAL_SECONDS)
+        self._state_updated.set()
+
+    def _joystick_loop(self):
+        """Background thread that collects joystick events as soon as the device reports them."""
+        while not self._polling_stop_event.is_set():
+            sense = self.sense
+            if not sense:
+                self._polling_stop_event.wait(5)
+                continue
+
+            try:
+                # The stick's evdev file is private to the sense_hat library; the emulator has none
+                stick_file = getattr(sense.stick, '_stick_file', None)
+                if stick_file is not None:
+                    ready, _, _ = select.select([stick_file], [], [], JOYSTICK_SELECT_TIMEOUT_SECONDS)
+                    if not ready:
+                        continue
+                else:
+                    self._polling_stop_event.wait(POLLING_INTERVAL_SECONDS)
+
+                joystick_events = [
+                    {"timestamp": event.timestamp, "direction": event.direction, "action": event.action}
+                    for event in sense.stick.get_events()
+                ]
+                if joystick_events:
+                    with self._joystick_lock:
+                        events = self._current_state["joystick_events"] + joystick_events
+                        self._current_state["joystick_events"] = events[-JOYSTICK_EVENT_HISTORY:]
+            except Exception as e:
+                logger.error(f"Error in Sense HAT joystick loop: {e}")
+                self._polling_stop_event.wait(5)
 
     def get_current_state(self):
         """
@@ -176,6 +260,22 @@ class SenseHatManager:
         self._check_and_set_sense_instance() # Ensure connection is active
         if not self.sense:
             return {"error": "Sense HAT hardware is not available or failed to initialize."}
+        now = time.monotonic()
+        was_idle = now - self._last_read_request_ts > SENSOR_IDLE_SECONDS
+        self._last_read_request_ts = now
+        if was_idle:
+            # The poller has been asleep; wake it and give it a moment for a fresh reading
+            self._last_wake_ts = time.time()
+            self._state_updated.clear()
+            self._wake_event.set()
+            self._state_updated.wait(SENSOR_WAKE_WAIT_SECONDS)
+        last_update = self._current_state.get("last_update", 0)
+        age = time.time() - last_update
+        # Time spent asleep while idle doesn't count; only a poller that was awake
+        # and still failed to refresh is stuck.
+        if time.time() - max(last_update, self._last_wake_ts) > SENSOR_STALE_SECONDS:
+            logger.warning(f"Sense HAT readings are stale ({age:.1f}s old).")
+            return {**self._current_state, "stale": True, "age_s": round(age, 2)}
         return self._current_state
 
     def execute_command(self, command, params=None):
@@ -187,7 +287,7 @@ class SenseHatManager:
             return {"error": "Sense HAT hardware not available. Command not executed."}
 
         params = params or {}
-        logging.info(f"Executing Sense HAT command '{command}' with params {params}")
+        logger.info(f"Executing Sense HAT command '{command}' with params {params}")
 
         try:
             if command == "display_message":
@@ -200,7 +300,11 @@ class SenseHatManager:
             elif command == "set_pixels":
                 pixel_list = params.get("pixel_list")
                 if isinstance(pixel_list, list) and len(pixel_list) == 64:
-                    self.sense.set_pixels([tuple(p) for p in pixel_list])
+                    # sense_hat accepts any 3-item sequence, so no per-pixel tuple copy is needed
+                    self.sense.set_pixels(pixel_list)
+                elif isinstance(pixel_list, list) and len(pixel_list) == LED_FLAT_FRAME_LENGTH:
+                    if not self._write_flat_frame(pixel_list):
+                        return {"error": "Invalid pixel_list format."}
                 else:
                     return {"error": "Invalid pixel_list format."}
             elif command == "clear":
@@ -210,20 +314,45 @@ class SenseHatManager:
 
             return {"success": True, "message": f"Command '{command}' executed."}
         except Exception as e:
-            logging.error(f"Error executing Sense HAT command '{command}': {e}", exc_info=True)
+            logger.error(f"Error executing Sense HAT command '{command}': {e}", exc_info=True)
             return {"success": False, "error": str(e)}
 
+    def _write_flat_frame(self, flat_rgb):
+        """
+        Displays a flat [R, G, B, R, G, B, ...] frame. With no rotation the
+        framebuffer is in row order, so the frame is packed to RGB565 and written
+        at once; otherwise it is handed to sense_hat as pixel triples.
+        """
+        if any(not isinstance(v, int) or v < 0 or v > 255 for v in flat_rgb):
+            return False
+        fb_device = getattr(self.sense, '_fb_device', None)
+        if fb_device and getattr(self.sense, 'rotation', 0) == 0:
+            red, green, blue = flat_rgb[0::3], flat_rgb[1::3], flat_rgb[2::3]
+            frame = array('H', [((r >> 3) << 11) | ((g >> 2) << 5) | (b >> 3)
+                                for r, g, b in zip(red, green, blue)])
+            with open(fb_device, 'wb') as fb:
+                fb.write(frame.tobytes())
+        else:
+            self.sense.set_pixels([flat_rgb[i:i + 3] for i in range(0, LED_FLAT_FRAME_LENGTH, 3)])
+        return True
+
     def close(self):
         """
         Stops the background polling thread and cleans up Sense HAT resources.
         """
-        logging.info("SenseHatManager: Stopping polling thread and clearing Sense HAT.")
+        logger.info("SenseHatManager: Stopping polling thread and clearing Sense HAT.")
         self._polling_stop_event.set()
+        self._wake_event.set()
         if self.polling_thread and self.polling_thread.is_alive():
             self.polling_thread.join(timeout=2)
+        if self.joystick_thread and self.joystick_thread.is_alive():
+            self.joystick_thread.join(timeout=2)
+        if self._cpu_temp_file is not None:
+            self._cpu_temp_file.close()
+            self._cpu_temp_file = None
 
         if self.sense:
             try:
                 self.sense.clear()
             except Exception as e:
-                logging.error(f"Error clearing Sense HAT on close: {e}")
+                logger.error(f"Error clearing Sense HAT on close: {e}")
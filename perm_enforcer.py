@@ -1,9 +1,12 @@
 import os
+import stat
 import pwd
 import grp
 import sqlite3
 import configparser
 import logging
+import multiprocessing
+import time
 from datetime import datetime
 
 # --- Constants ---
@@ -19,13 +22,50 @@ DATABASE_FILE = os.path.join(HTTP_WEB_ROOT, 'permissions.db')
 # This file contains settings for user, group, and other parameters.
 MASTER_CONFIG_PATH = os.path.join(HTTP_WEB_ROOT, 'app_config.ini')
 
+# Modes enforced on directories (rwxr-xr-x) and files (rw-r--r--).
+DIR_MODE = 0o755
+FILE_MODE = 0o644
+
+# Number of file records written per transaction during the walk.
+# Batching bounds memory on large trees while keeping commits rare.
+RECORD_BATCH_SIZE = 10_000
+
+# Statement used to insert or refresh a file record. ON CONFLICT updates the
+# existing row in place; INSERT OR REPLACE deleted and re-inserted it.
+# Built as one compact string (no triple-quote indentation) that SQLite parses
+# once per executemany() and finds in the connection's statement cache.
+_UPSERT_SQL = (
+    "INSERT INTO files (path, uid, gid, mode, last_verified) VALUES (?, ?, ?, ?, ?) "
+    "ON CONFLICT(path) DO UPDATE SET uid = excluded.uid, gid = excluded.gid, "
+    "mode = excluded.mode, last_verified = excluded.last_verified"
+)
+
 # --- Logging Configuration ---
-# Set up basic logging to output informational messages.
-# This helps in debugging and tracking the script's execution.
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# Basic logging to output informational messages is set up in the __main__
+# block below, so importing this module leaves the caller's logging untouched.
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
 
 # --- Database Functions ---
 
+def open_database(path):
+    """
+    Open the permissions database with the settings used by every writer.
+
+    WAL lets the walk's worker processes write concurrently with readers, and
+    synchronous=NORMAL avoids a full fsync on every commit. The timeout lets a
+    worker wait out another worker's write transaction.
+
+    Args:
+        path (str): The path to the SQLite database file.
+
+    Returns:
+        An open sqlite3 connection.
+    """
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
 def create_file_table(conn):
     """
     Create the 'files' table in the database if it doesn't already exist.
@@ -36,56 +76,112 @@ def create_file_table(conn):
     Args:
         conn: An active sqlite3 database connection object.
     """
+    # The rebuild must be atomic, but Python's sqlite3 runs DDL in autocommit mode
+    # outside an explicit transaction, so the transaction is managed by hand.
+    previous_isolation = conn.isolation_level
+    conn.isolation_level = None
     try:
-        cursor = conn.cursor()
-        # The 'last_verified' column is a timestamp to track when the permissions were last checked.
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS files (
-                id INTEGER PRIMARY KEY,
-                path TEXT UNIQUE NOT NULL,
-                owner TEXT NOT NULL,
-                grp TEXT NOT NULL,
-                permissions TEXT NOT NULL,
-                last_verified TEXT NOT NULL
-            )
-        ''')
-        conn.commit()
+        # Older tables store owner/grp/permissions/last_verified as TEXT (and, before
+        # v1.6, have a rowid 'id' column); rebuild them in the current layout.
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(files)")]
+        legacy = 'owner' in columns
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if legacy:
+                logging.info("Migrating 'files' table to the integer, WITHOUT ROWID layout...")
+                conn.execute("ALTER TABLE files RENAME TO files_old")
+            # The 'last_verified' column is a Unix timestamp to track when the permissions were last checked.
+            # WITHOUT ROWID keys the table directly on path: one B-tree per row instead of a
+            # rowid table plus a separate unique index on path.
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS files (
+                    path TEXT PRIMARY KEY NOT NULL,
+                    uid INTEGER NOT NULL,
+                    gid INTEGER NOT NULL,
+                    mode INTEGER NOT NULL,
+                    last_verified INTEGER NOT NULL
+                ) WITHOUT ROWID
+            ''')
+            if legacy:
+                converted, skipped = [], 0
+                for path, owner, group, perms, verified in conn.execute(
+                        "SELECT path, owner, grp, permissions, last_verified FROM files_old"):
+                    try:
+                        converted.append((path, int(owner), int(group), int(perms, 8),
+                                          int(datetime.fromisoformat(verified).timestamp())))
+                    except (TypeError, ValueError):
+                        # Unparsable legacy row; the next walk re-records the path anyway
+                        skipped += 1
+                conn.executemany(_UPSERT_SQL, converted)
+                conn.execute("DROP TABLE files_old")
+                if skipped:
+                    logging.warning(f"Skipped {skipped} unparsable rows while migrating 'files'.")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
         logging.info("Database table 'files' created or already exists.")
     except sqlite3.Error as e:
         logging.error(f"Database error while creating table: {e}")
         # Exit if the database table cannot be created, as it's critical for operation.
         exit(1)
+    finally:
+        conn.isolation_level = previous_isolation
 
-def update_file_record(conn, path, owner, group, perms):
+def update_file_records(conn, records, cursor=None):
     """
-    Insert or update a record for a file or directory in the database.
+    Insert or update the records for a batch of files and directories.
 
-    This function ensures that the database always has the latest permission
-    information for each file and directory being managed.
+    All rows are written with one executemany() inside a single transaction, so
+    the database is synced once per batch instead of once per file.
 
     Args:
         conn: An active sqlite3 database connection object.
-        path (str): The absolute path to the file or directory.
-        owner (str): The username of the owner.
-        group (str): The group name of the owner.
-        perms (str): The permission string (e.g., '0755').
+        records (list): (path, uid, gid, mode, last_verified) tuples of integers
+            (apart from path); last_verified is a Unix timestamp.
+        cursor: Optional cursor on conn to reuse across batches, so every batch
+            runs the same prepared upsert statement.
     """
     try:
-        cursor = conn.cursor()
-        # Use ISO 8601 format for the timestamp for consistency.
-        timestamp = datetime.now().isoformat()
-        # Use INSERT OR REPLACE to handle both new and existing records efficiently.
-        cursor.execute('''
-            INSERT OR REPLACE INTO files (path, owner, grp, permissions, last_verified)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (path, owner, group, perms, timestamp))
-        conn.commit()
+        with conn:
+            # Upsert to handle both new and existing records efficiently.
+            (cursor or conn).executemany(_UPSERT_SQL, records)
     except sqlite3.Error as e:
-        # Log errors but don't exit, to allow the script to continue with other files.
-        logging.error(f"Failed to update record for {path}: {e}")
+        # Log errors but don't exit, to allow the script to continue.
+        logging.error(f"Failed to update {len(records)} file records: {e}")
 
 # --- Core Logic ---
 
+def apply_ownership_and_mode(path, uid, gid, mode, dir_fd=None):
+    """
+    Set the owner, group and mode of a path, skipping whatever already matches.
+
+    Re-runs over an unchanged tree then cost one stat() per entry instead of a
+    chown() and chmod() each.
+
+    Args:
+        path (str): The path to the file or directory; with dir_fd, a name
+            relative to that directory.
+        uid (int): The numeric user ID to set as owner.
+        gid (int): The numeric group ID to set as owner.
+        mode (int): The permission bits to set (e.g., 0o755).
+        dir_fd (int): Optional open directory descriptor `path` is relative to,
+            so the kernel resolves one component instead of the full path.
+
+    Returns:
+        True if anything was changed, False if the path was already correct.
+    """
+    # stat() follows symlinks, matching what chown() and chmod() act on.
+    st = os.stat(path, dir_fd=dir_fd)
+    changed = False
+    if st.st_uid != uid or st.st_gid != gid:
+        os.chown(path, uid, gid, dir_fd=dir_fd)
+        changed = True
+    if stat.S_IMODE(st.st_mode) != mode:
+        os.chmod(path, mode, dir_fd=dir_fd)
+        changed = True
+    return changed
+
 def load_master_config():
     """
     Load the master configuration from the .ini file.
@@ -150,7 +246,7 @@ def validate_user_and_group(user, group):
 
     return uid, gid
 
-def enforce_permissions(web_root, uid, gid, db_conn):
+def enforce_permissions(web_root, uid, gid, db_conn, recursive=True):
     """
     Recursively enforce permissions on all files and directories in the web root.
 
@@ -163,48 +259,149 @@ def enforce_permissions(web_root, uid, gid, db_conn):
         uid (int): The numeric user ID to set as owner.
         gid (int): The numeric group ID to set as owner.
         db_conn: An active sqlite3 database connection object.
+        recursive (bool): If False, only the direct children of web_root are
+            processed (their contents are left to parallel workers).
     """
     logging.info(f"Starting permission enforcement walk from '{web_root}'...")
     # Use a set for efficient lookup of paths to ignore.
-    ignore_paths = {DATABASE_FILE, MASTER_CONFIG_PATH}
+    # The WAL-mode database keeps -wal and -shm files next to it.
+    ignore_paths = {DATABASE_FILE, DATABASE_FILE + '-wal', DATABASE_FILE + '-shm', MASTER_CONFIG_PATH}
+    # Group the ignored names by parent directory; every other directory in the
+    # walk then needs a single dict lookup instead of a join + set test per entry.
+    ignore_names_by_dir = {}
+    for ignored in ignore_paths:
+        ignore_names_by_dir.setdefault(os.path.dirname(ignored), set()).add(os.path.basename(ignored))
+    # Database rows are collected here and written in batches of RECORD_BATCH_SIZE.
+    records = []
+    # One cursor for every batch of the walk, keeping the upsert statement prepared.
+    cursor = db_conn.cursor()
+    # Every entry checked by this walk shares one last_verified timestamp.
+    verified_at = int(time.time())
+    # Per-entry changes are only logged at DEBUG; the walk reports these totals instead.
+    debug_enabled = logging.getLogger().isEnabledFor(logging.DEBUG)
+    n_dirs = n_files = n_changed = n_errors = 0
+
+    # fwalk() yields an open descriptor per directory, so each entry is changed
+    # relative to its parent instead of re-resolving the absolute path. It is
+    # built on scandir() and uses the d_type from readdir() to tell directories
+    # from files, so the walk itself does not stat() entries. The one stat() per
+    # entry is in apply_ownership_and_mode(); DirEntry.stat() would not save it,
+    # since on Linux it is only cached after its own stat() call.
+    for root, dirs, files, root_fd in os.fwalk(web_root):
+        ignored_names = ignore_names_by_dir.get(root)
+        if ignored_names:
+            for name in ignored_names.intersection(dirs):
+                logging.info(f"Skipping ignored directory: {os.path.join(root, name)}")
+            for name in ignored_names.intersection(files):
+                logging.info(f"Skipping ignored file: {os.path.join(root, name)}")
+            # Pruning dirs in place also stops the walk descending into ignored directories.
+            dirs[:] = [name for name in dirs if name not in ignored_names]
+            files = [name for name in files if name not in ignored_names]
 
-    for root, dirs, files in os.walk(web_root):
         # --- Enforce on directories ---
         for name in dirs:
             path = os.path.join(root, name)
-            if path in ignore_paths:
-                logging.info(f"Skipping ignored directory: {path}")
-                continue
             try:
-                # Set ownership first.
-                os.chown(path, uid, gid)
-                # Set directory permissions: 755 (rwxr-xr-x).
-                os.chmod(path, 0o755)
-                logging.info(f"Set [DIR] {path} -> Owner: {uid}, Group: {gid}, Perms: 0755")
-                # Update the database record for the directory.
-                update_file_record(db_conn, path, str(uid), str(gid), '0755')
+                # Set directory ownership and permissions: 755 (rwxr-xr-x).
+                n_dirs += 1
+                if apply_ownership_and_mode(name, uid, gid, DIR_MODE, dir_fd=root_fd):
+                    n_changed += 1
+                    if debug_enabled:
+                        logging.debug(f"Set [DIR] {path} -> Owner: {uid}, Group: {gid}, Perms: {DIR_MODE:04o}")
+                # Queue the database record for the directory.
+                records.append((path, uid, gid, DIR_MODE, verified_at))
+                if len(records) >= RECORD_BATCH_SIZE:
+                    update_file_records(db_conn, records, cursor)
+                    records.clear()
             except OSError as e:
+                n_errors += 1
                 logging.error(f"Failed to set perms for DIR {path}: {e}")
 
         # --- Enforce on files ---
         for name in files:
             path = os.path.join(root, name)
-            if path in ignore_paths:
-                logging.info(f"Skipping ignored file: {path}")
-                continue
             try:
-                # Set ownership first.
-                os.chown(path, uid, gid)
-                # Set file permissions: 644 (rw-r--r--).
-                os.chmod(path, 0o644)
-                logging.info(f"Set [FILE] {path} -> Owner: {uid}, Group: {gid}, Perms: 0644")
-                # Update the database record for the file.
-                update_file_record(db_conn, path, str(uid), str(gid), '0644')
+                # Set file ownership and permissions: 644 (rw-r--r--).
+                n_files += 1
+                if apply_ownership_and_mode(name, uid, gid, FILE_MODE, dir_fd=root_fd):
+                    n_changed += 1
+                    if debug_enabled:
+                        logging.debug(f"Set [FILE] {path} -> Owner: {uid}, Group: {gid}, Perms: {FILE_MODE:04o}")
+                # Queue the database record for the file.
+                records.append((path, uid, gid, FILE_MODE, verified_at))
+                if len(records) >= RECORD_BATCH_SIZE:
+                    update_file_records(db_conn, records, cursor)
+                    records.clear()
             except OSError as e:
+                n_errors += 1
                 logging.error(f"Failed to set perms for FILE {path}: {e}")
 
-    logging.info("Permission enforcement walk completed.")
+        if not recursive:
+            break
+
+    # Flush the final partial batch.
+    if records:
+        update_file_records(db_conn, records, cursor)
+    logging.info(f"Permission enforcement walk of '{web_root}' completed: {n_dirs} dirs, "
+                 f"{n_files} files, {n_changed} changed, {n_errors} errors.")
+
 
+def _init_worker(log_level):
+    """Pool initializer: spawned workers start without the parent's logging setup."""
+    logging.basicConfig(level=log_level, format=LOG_FORMAT)
+
+def _enforce_subtree(args):
+    """
+    Pool worker: enforce permissions below one top-level directory.
+
+    SQLite connections cannot be shared across processes, so each worker opens
+    its own.
+
+    Args:
+        args (tuple): (subroot, uid, gid).
+    """
+    subroot, uid, gid = args
+    try:
+        db_conn = open_database(DATABASE_FILE)
+    except sqlite3.Error as e:
+        logging.error(f"Could not open database for subtree {subroot}: {e}")
+        return
+    try:
+        enforce_permissions(subroot, uid, gid, db_conn)
+    except Exception as e:
+        logging.critical(f"An unexpected error occurred while enforcing {subroot}: {e}")
+    finally:
+        db_conn.close()
+
+def enforce_permissions_parallel(web_root, uid, gid, db_conn):
+    """
+    Enforce permissions with the walk sharded across processes.
+
+    The direct children of web_root are handled in this process; the contents
+    of each top-level directory are walked by a separate pool worker, since the
+    walk is bound by per-file syscall latency.
+
+    Args:
+        web_root (str): The path to the web root directory.
+        uid (int): The numeric user ID to set as owner.
+        gid (int): The numeric group ID to set as owner.
+        db_conn: An active sqlite3 database connection object.
+    """
+    enforce_permissions(web_root, uid, gid, db_conn, recursive=False)
+    # Symlinked directories are not descended into, matching the serial walk.
+    with os.scandir(web_root) as entries:
+        subroots = [entry.path for entry in entries if entry.is_dir(follow_symlinks=False)]
+    if len(subroots) < 2:
+        for subroot in subroots:
+            enforce_permissions(subroot, uid, gid, db_conn)
+        return
+    workers = min(len(subroots), os.cpu_count() or 1)
+    # 'spawn', not the default fork: db_conn is open here, and SQLite connections
+    # must not be carried across fork(). Workers open their own in _enforce_subtree.
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(workers, initializer=_init_worker,
+                      initargs=(logging.getLogger().getEffectiveLevel(),)) as pool:
+        pool.map(_enforce_subtree, [(subroot, uid, gid) for subroot in subroots])
 
 # --- Main Execution ---
 
@@ -259,7 +456,7 @@ def main():
     # Step 3: Initialize Database
     logging.info(f"Initializing database at {DATABASE_FILE}...")
     try:
-        db_conn = sqlite3.connect(DATABASE_FILE)
+        db_conn = open_database(DATABASE_FILE)
         create_file_table(db_conn)
     except sqlite3.Error as e:
         logging.error(f"CRITICAL: Could not connect to database {DATABASE_FILE}: {e}")
@@ -267,7 +464,7 @@ def main():
 
     # Step 4: Enforce Permissions
     try:
-        enforce_permissions(HTTP_WEB_ROOT, uid, gid, db_conn)
+        enforce_permissions_parallel(HTTP_WEB_ROOT, uid, gid, db_conn)
     except Exception as e:
         logging.critical(f"An unexpected error occurred during permission enforcement: {e}")
     finally:
@@ -280,6 +477,7 @@ def main():
 
 if __name__ == '__main__':
     # This block ensures that the main() function is called only when the script is executed directly.
+    logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
     main()
 
 # --- Changelog ---
@@ -307,6 +505,47 @@ if __name__ == '__main__':
 #   - Added extensive docstrings and comments to improve maintainability.
 #   - Corrected the use of an apostrophe in a comment that could be mistaken for a syntax error.
 #
-# v1.5 (this version):
+# v1.5:
 #   - Fixed a syntax error in a docstring caused by an unescaped apostrophe.
 #   - Finalized docstrings and comments for clarity.
+#
+# v1.6 (this version): Performance.
+#   - File records are collected during the walk and written with a single
+#     executemany() in one transaction, instead of a commit per file.
+#   - The database is opened in WAL mode with synchronous=NORMAL; its -wal and
+#     -shm files are skipped by the walk like the database itself.
+#   - Records are flushed every RECORD_BATCH_SIZE (10,000) rows, so memory stays
+#     bounded on large trees; the statement is the module constant _UPSERT_SQL.
+#   - Entries are stat()ed first and only chown()ed / chmod()ed where the owner,
+#     group or mode actually differ. Records are still written, since
+#     last_verified tracks when each entry was last checked.
+#   - The walk uses os.fwalk() and changes each entry relative to its parent
+#     directory descriptor; full paths are only built for logging and the
+#     database.
+#   - Each top-level directory of the web root is walked by its own
+#     multiprocessing.Pool worker (with its own database connection); the
+#     web root's direct children are handled by the main process. The pool
+#     uses the 'spawn' start method so the parent's open SQLite connection is
+#     never inherited across fork().
+#   - Ignored paths are checked by name only in their parent directory, and
+#     ignored directories are pruned from the walk instead of being descended.
+#   - Per-entry "Set" messages are logged at DEBUG only (and not formatted
+#     otherwise); each walk logs one INFO summary of dirs, files, changes and
+#     errors. logging.basicConfig moved to the __main__ block.
+#   - File records are upserted with INSERT ... ON CONFLICT(path) DO UPDATE,
+#     updating rows in place instead of INSERT OR REPLACE's delete + insert.
+#   - The 'files' table is keyed on path WITHOUT ROWID (the 'id' column is
+#     dropped); existing tables are migrated by create_file_table() in one
+#     explicit BEGIN/COMMIT (rolled back on failure), skipping unparsable rows.
+#   - Ownership and mode are stored as INTEGER uid/gid/mode columns and
+#     last_verified as a Unix timestamp, instead of TEXT built with str(),
+#     octal strings and datetime.isoformat() per entry.
+#   - Each walk reuses one cursor for all of its record batches.
+#   - The enforced modes are the DIR_MODE / FILE_MODE constants; uid and gid
+#     are validated once in main() and used as plain ints throughout the walk.
+#   - Documented why the walk stays on os.fwalk() rather than a hand-rolled
+#     scandir() walk: neither needs more than the one stat() per entry.
+#   - _UPSERT_SQL is a single compact string rather than an indented
+#     triple-quoted block.
+#   - All records from one walk share a single last_verified timestamp taken
+#     before the walk, instead of reading the clock per entry.
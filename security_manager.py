@@ -3,7 +3,7 @@
 #
 
 # ==============================================================================
-# Version: 1.2.1 (Argon2 Password Verification)
+# Version: 1.3.0 (Authentication Performance)
 #
 # Changelog:
 # - Version 1.1.0: Corrected class name from Security_Manager to SecurityManager
@@ -15,16 +15,30 @@
 # - Version 1.2.1: Updated `verify_credentials` to use Argon2 for secure
 #   password verification, replacing the insecure direct string comparison.
 #   Requires 'argon2-cffi' library.
+# - Version 1.3.0: Successful Argon2 verifications are cached for
+#   VERIFY_CACHE_TTL_SECONDS, keyed on the username, the stored hash and a
+#   keyed BLAKE2 digest of the password, so repeat logins skip the KDF.
+#   Added `verify_and_authorize`, which returns the role from the same user
+#   lookup as the password check.
+#   The Argon2 hasher is the module-level `PH` from database.py, so hashing and
+#   verification share one instance and cost profile. A stored hash is re-hashed
+#   on the next successful login only if its cost parameters are all at or below
+#   the current profile and at least one is lower; stronger hashes are kept.
 # - Version 1.0.0: Initial implementation.
 # ==============================================================================
 
 import logging
+import hashlib
+import secrets
+import threading
+import time
 
 # Import Argon2 for password verification
 try:
-    from argon2 import PasswordHasher
-    from argon2.exceptions import VerifyMismatchError
-    PH = PasswordHasher()
+    from argon2 import extract_parameters
+    from argon2.exceptions import VerifyMismatchError, InvalidHashError
+    # The same instance and cost profile DatabaseManager hashes passwords with
+    from database import PH
     ARGON2_AVAILABLE = True
 except ImportError:
     ARGON2_AVAILABLE = False
@@ -44,6 +58,37 @@ except Exception as e:
 # Configure logging for this module
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# How long a successful password verification is reused before Argon2 runs again
+VERIFY_CACHE_TTL_SECONDS = 30
+# Upper bound on cached verifications; the oldest entry is evicted beyond this
+VERIFY_CACHE_MAX_ENTRIES = 1024
+# Per-process BLAKE2 key, so cache entries hold a keyed digest and never the password
+_VERIFY_CACHE_KEY = secrets.token_bytes(32)
+# (username, password_hash, digest) -> expiry. Module-level because a SecurityManager
+# is constructed per request. Including the stored hash means a password change
+# never matches an old entry. Only successes are cached, so wrong guesses still pay
+# the full Argon2 cost.
+_verify_cache = {}
+_verify_cache_lock = threading.Lock()
+
+def _verify_cache_key(username, password_hash, password):
+    digest = hashlib.blake2b(password.encode(), key=_VERIFY_CACHE_KEY, digest_size=16).digest()
+    return (username, password_hash, digest)
+
+def _hash_cost_is_lower(password_hash):
+    """
+    True only if the stored hash is cheaper than PH in some parameter and not more
+    expensive in any. Stronger or mixed profiles (e.g. argon2's 64 MiB default) are
+    left alone instead of being rewritten to the current, possibly weaker, profile.
+    """
+    try:
+        stored = extract_parameters(password_hash)
+    except (InvalidHashError, ValueError):
+        return False
+    current = ((stored.time_cost, PH.time_cost), (stored.memory_cost, PH.memory_cost),
+               (stored.parallelism, PH.parallelism))
+    return all(s <= c for s, c in current) and any(s < c for s, c in current)
+
 class SecurityManager:
     """
     Manages authentication and authorization for the application.
@@ -59,37 +104,64 @@ class SecurityManager:
         self.db_manager = db_manager
         logging.info("SecurityManager initialized.")
 
-    def verify_credentials(self, username, password):
+    def verify_and_authorize(self, username, password):
         """
-        Verifies user credentials against the database using Argon2 hashing.
-        
+        Verifies user credentials and returns the user's role from the same
+        database lookup, so authenticated requests read the user record once.
+
         Args:
             username (str): The username to verify.
             password (str): The plaintext password to verify.
 
         Returns:
-            bool: True if credentials are valid, False otherwise.
+            tuple: (True, role) if credentials are valid, (False, None) otherwise.
         """
         user_record = self.db_manager.get_user_with_hash(username)
         
         if user_record:
             if not ARGON2_AVAILABLE:
                 logging.error("Argon2 not available. Cannot securely verify credentials.")
-                return False # Or fallback to dummy, but better to fail securely
+                return False, None # Or fallback to dummy, but better to fail securely
+
+            cache_key = _verify_cache_key(username, user_record['password_hash'], password)
+            expires_at = _verify_cache.get(cache_key)
+            if expires_at is not None and time.monotonic() < expires_at:
+                logging.debug(f"Credentials valid for user: {username} (cached)")
+                return True, user_record['role']
 
             try:
                 PH.verify(user_record['password_hash'], password)
                 logging.info(f"Credentials valid for user: {username}")
-                return True
+                if _hash_cost_is_lower(user_record['password_hash']):
+                    # Stored with a cheaper cost profile; re-hash with the current one
+                    self.db_manager.update_user_password(username, password)
+                with _verify_cache_lock:
+                    if len(_verify_cache) >= VERIFY_CACHE_MAX_ENTRIES:
+                        _verify_cache.pop(next(iter(_verify_cache)))
+                    _verify_cache[cache_key] = time.monotonic() + VERIFY_CACHE_TTL_SECONDS
+                return True, user_record['role']
             except VerifyMismatchError:
                 logging.warning(f"Invalid password for user: {username} (Argon2 mismatch).")
-                return False
+                return False, None
             except Exception as e:
                 logging.error(f"Error during password verification for user '{username}': {e}")
-                return False
+                return False, None
         else:
             logging.warning(f"User not found: {username}")
-        return False
+        return False, None
+
+    def verify_credentials(self, username, password):
+        """
+        Verifies user credentials against the database using Argon2 hashing.
+        
+        Args:
+            username (str): The username to verify.
+            password (str): The plaintext password to verify.
+
+        Returns:
+            bool: True if credentials are valid, False otherwise.
+        """
+        return self.verify_and_authorize(username, password)[0]
 
     def get_user_role(self, username):
         """
@@ -1,29 +1,65 @@
 #!/usr/bin/env python3
 # ==============================================================================
 # pi_backend_py_installer - The Definitive Installer & Service Manager
-# Version: 2.0.10 (Enhanced Gunicorn Debugging)
+# Version: 2.1.0 (Setup Performance)
 #
 # Description:
 # This script is a full Python rewrite of the original `pi_backend` bash
 # installer. It provides an idempotent workflow for initial installation,
 # updates, and system management.
 #
-# Changelog (v2.0.10):
-# - FIX: Enhanced `test_api` function to provide more specific debugging guidance
-#   if the API test fails, including checking the `pi_backend_api.service` status
-#   and its journal logs, which is crucial for diagnosing "Service Unavailable" errors.
-#   Also explicitly checks for Gunicorn process.
-# - FEAT: Introduced `self.static_web_root` to separate web-accessible static
-#   files (like index.html) from backend Python code for improved security.
-# - REFACTOR: Modified `deploy_and_manage_files` to copy `index.html` to
-#   `self.static_web_root` and ensure Python files remain in `self.install_path`.
-# - REFACTOR: Updated `configure_apache` to set `DocumentRoot` to `self.static_web_root`,
-#   add `DirectoryIndex index.html`, and explicitly deny direct web access to
-#   `self.install_path` (where Python files reside).
-# - FIX: Corrected `NameError` in `download_skyfield_data`.
-# - FEAT: Modified `run_update_and_patch` to always perform file deployment and
-#   service reinstallation when invoked, ensuring services are refreshed
-#   with every update check, even if no file differences are automatically detected.
+# Changelog (v2.1.0):
+# - PERF: Reuse one lazily opened SQLite connection (`self._conn`) across the
+#   config helpers instead of opening and closing a connection per call. It is
+#   closed once via `close()` / `__del__`.
+# - PERF: `migrate_ini_to_db` writes every key in one transaction with
+#   `executemany` instead of one upsert and commit per key.
+# - PERF: `_get_config_from_db` memoizes lookups in `self._cfg_cache`; writes
+#   through `_set_config_in_db` update it in place.
+# - PERF: The setup connection uses `synchronous=NORMAL`, in-memory temp storage
+#   and an 8 MiB page cache. The journal mode is left to the www-data runtime.
+# - PERF: `verify_prerequisites` checks all apt packages with one `dpkg-query -W`
+#   instead of spawning `dpkg -s` per package.
+# - PERF: `manage_ssl_certificate` lists certificate directories with one
+#   `find -type d` instead of `ls` plus a `test -d` per entry.
+# - PERF: `_get_cert_details` reads the expiry date and fingerprint with one
+#   `openssl x509` call instead of two.
+# - PERF: `_read_sudo_file`/`_write_sudo_file` use direct file I/O when running as
+#   root, and otherwise a single persistent sudo helper (`SUDO_FILE_HELPER`)
+#   instead of a `sudo cat`/`sudo mv` per file. They fall back to the old
+#   commands if the helper can't be started.
+# - PERF: `_strip_colors` uses the module-level precompiled `ANSI_ESCAPE_RE`.
+# - PERF: `configure_gpsd` uses the class-level `_GPSD_DEVICES_RE` /
+#   `_GPSD_OPTIONS_RE` patterns instead of compiling regex literals per call.
+# - PERF: `initial_directory_setup` runs its mkdir/chown/chmod calls in one
+#   privileged `sh -c` instead of a sudo subprocess each.
+# - PERF: Group membership checks use `_get_user_groups` (pwd/grp/os.getgrouplist)
+#   instead of forking `groups` once per group.
+# - PERF: Apache and systemd templates are filled by `_substitute_placeholders`
+#   in one regex pass instead of one `str.replace` scan per placeholder.
+# - PERF: `migrate_ini_to_db` uses `_insert_new_config` (INSERT OR IGNORE), since the
+#   table is empty at that point; the upsert is kept for `_set_config_in_db`.
+# - PERF: `run_first_time_setup` downloads the Skyfield data in a background thread
+#   while `configure_gpsd` and then `configure_chrony_for_gps` run in order. The
+#   download's output is buffered (`_run_buffered`) and printed once it is done.
+#
+# DEV_NOTES:
+# - v2.0.10:
+#   - FIX: Enhanced `test_api` function to provide more specific debugging guidance
+#     if the API test fails, including checking the `pi_backend_api.service` status
+#     and its journal logs, which is crucial for diagnosing "Service Unavailable" errors.
+#     Also explicitly checks for Gunicorn process.
+#   - FEAT: Introduced `self.static_web_root` to separate web-accessible static
+#     files (like index.html) from backend Python code for improved security.
+#   - REFACTOR: Modified `deploy_and_manage_files` to copy `index.html` to
+#     `self.static_web_root` and ensure Python files remain in `self.install_path`.
+#   - REFACTOR: Updated `configure_apache` to set `DocumentRoot` to `self.static_web_root`,
+#     add `DirectoryIndex index.html`, and explicitly deny direct web access to
+#     `self.install_path` (where Python files reside).
+#   - FIX: Corrected `NameError` in `download_skyfield_data`.
+#   - FEAT: Modified `run_update_and_patch` to always perform file deployment and
+#     service reinstallation when invoked, ensuring services are refreshed
+#     with every update check, even if no file differences are automatically detected.
 #
 # Author: Gemini
 # ==============================================================================
@@ -37,9 +73,15 @@ import re
 import requests
 import time
 import getpass
+import grp
+import json
+import pwd
+import shlex
 import shutil
 import sqlite3
 import textwrap
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 # --- Style & Formatting (Updated for Readability) ---
@@ -50,12 +92,54 @@ C_CYAN = '\033[0;36m'
 C_NC = '\033[0m' # No Color
 C_BOLD = '\033[1m'
 
+# Matches any SGR escape sequence, compiled once for _strip_colors
+ANSI_ESCAPE_RE = re.compile(r'\x1b\[[0-9;]*m')
+
+# SQLite page cache for the setup connection (negative = KiB, i.e. 8 MiB)
+DB_CACHE_SIZE_KIB = -8192
+
+# Privileged file helper, started once under sudo and fed one JSON request per line
+SUDO_FILE_HELPER = textwrap.dedent("""
+    import json, os, sys
+    for line in sys.stdin:
+        req = json.loads(line)
+        try:
+            if req["op"] == "read":
+                with open(req["path"], errors="ignore") as f:
+                    resp = {"ok": True, "content": f.read()}
+            else:
+                tmp = req["path"] + ".pi_backend_tmp"
+                with open(tmp, "w") as f:
+                    f.write(req["content"])
+                os.replace(tmp, req["path"])
+                resp = {"ok": True}
+        except OSError as e:
+            resp = {"ok": False, "error": str(e)}
+        sys.stdout.write(json.dumps(resp) + "\\n")
+        sys.stdout.flush()
+""")
+
 class PiBackendManager:
     """
     Manages the installation, configuration, and maintenance of the pi_backend application.
     """
+    # Upsert used for every write into the configuration table
+    _UPSERT_CONFIG_SQL = (
+        "INSERT INTO configuration (key, value, updated_at) VALUES (?, ?, CURRENT_TIMESTAMP) "
+        "ON CONFLICT(key) DO UPDATE SET value = excluded.value, updated_at = CURRENT_TIMESTAMP"
+    )
+    # Plain insert for keys that don't exist yet (the UNIQUE key's index makes it one lookup)
+    _INSERT_NEW_CONFIG_SQL = "INSERT OR IGNORE INTO configuration (key, value) VALUES (?, ?)"
+    # Fields of `openssl x509 -noout -enddate -fingerprint -sha256` output
+    # (OpenSSL 3 prints "sha256 Fingerprint=", 1.1 prints "SHA256 Fingerprint=")
+    _CERT_ENDDATE_RE = re.compile(r'^notAfter=(.*)$', re.MULTILINE)
+    _CERT_FINGERPRINT_RE = re.compile(r'^SHA256 Fingerprint=(.*)$', re.MULTILINE | re.IGNORECASE)
+    # Lines rewritten in /etc/default/gpsd by configure_gpsd
+    _GPSD_DEVICES_RE = re.compile(r'^DEVICES=".*"', re.MULTILINE)
+    _GPSD_OPTIONS_RE = re.compile(r'^GPSD_OPTIONS=".*"', re.MULTILINE)
+
     def __init__(self):
-        self.script_version = "2.0.10" # Updated version for this release
+        self.script_version = "2.1.0" # Updated version for this release
         self.source_dir = os.path.dirname(os.path.abspath(__file__))
         self.current_user = getpass.getuser()
 
@@ -96,6 +180,12 @@ class PiBackendManager:
         # State
         self.apache_domain = ""
         self.patch_needed = False
+        self._conn = None # Lazily opened, shared by all config helpers
+        self._conn_path = None
+        self._cfg_cache = {} # full_key -> value (None if absent), valid for self._conn
+        self._sudo_helper = None # Popen of SUDO_FILE_HELPER; False once it has failed
+        self._sudo_helper_lock = threading.Lock() # One request/response on the pipe at a time
+        self._output = threading.local() # Per-thread echo buffer, see _run_buffered
 
         self._load_master_config()
 
@@ -130,21 +220,95 @@ class PiBackendManager:
             if e.stdout: self._echo_error(f"Stdout: {e.stdout.strip()}")
             return e
             
+    def _sudo_helper_request(self, request):
+        """Sends one request to the persistent sudo file helper. Returns None if it is unavailable."""
+        with self._sudo_helper_lock:
+            return self._sudo_helper_request_locked(request)
+
+    def _sudo_helper_request_locked(self, request):
+        if self._sudo_helper is None:
+            try:
+                self._sudo_helper = subprocess.Popen(
+                    ['sudo', sys.executable, '-c', SUDO_FILE_HELPER],
+                    stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+            except OSError:
+                self._sudo_helper = False
+        if not self._sudo_helper:
+            return None
+        try:
+            self._sudo_helper.stdin.write(json.dumps(request) + "\n")
+            self._sudo_helper.stdin.flush()
+            return json.loads(self._sudo_helper.stdout.readline())
+        except (OSError, ValueError):
+            # Helper died (e.g. sudo was refused); use one-shot commands from now on.
+            self._sudo_helper = False
+            return None
+
+    def _run_quiet(self, command):
+        """Runs a sudo command with its output captured, reporting stderr through _echo_error on failure."""
+        result = self._run_command(command, capture=True)
+        if result is not None and result.returncode != 0 and result.stderr:
+            self._echo_error(result.stderr.strip())
+        return result
+
     def _read_sudo_file(self, file_path):
         """Reads a file that requires sudo permissions."""
+        if os.geteuid() == 0:
+            try:
+                with open(file_path, errors='ignore') as f:
+                    return f.read()
+            except OSError:
+                return None
+        resp = self._sudo_helper_request({'op': 'read', 'path': file_path})
+        if resp is not None:
+            return resp['content'] if resp['ok'] else None
         result = self._run_command(['cat', file_path], capture=True, as_sudo=True)
         return result.stdout if result and result.returncode == 0 else None
 
     def _write_sudo_file(self, file_path, content):
         """Writes content to a file that requires sudo permissions."""
-        temp_path = f"/tmp/pi_backend_temp_{os.getpid()}"
+        if os.geteuid() == 0:
+            try:
+                with open(file_path, 'w') as f:
+                    f.write(content)
+            except OSError as e:
+                self._echo_error(f"Failed to write {file_path}: {e}")
+            return
+        resp = self._sudo_helper_request({'op': 'write', 'path': file_path, 'content': content})
+        if resp is not None:
+            if not resp['ok']:
+                self._echo_error(f"Failed to write {file_path}: {resp['error']}")
+            return
+        temp_path = f"/tmp/pi_backend_temp_{os.getpid()}_{threading.get_ident()}"
         with open(temp_path, 'w') as f:
             f.write(content)
         self._run_command(['mv', temp_path, file_path])
 
+    def _substitute_placeholders(self, content, replacements):
+        """Replaces every template placeholder in a single regex pass over the content."""
+        if not replacements:
+            return content
+        # Longest first, so a placeholder that contains another one wins.
+        pattern = re.compile('|'.join(re.escape(k) for k in sorted(replacements, key=len, reverse=True)))
+        return pattern.sub(lambda m: str(replacements[m.group(0)]), content)
+
+    def _get_user_groups(self):
+        """Returns the names of all groups the current user belongs to, without spawning `groups`."""
+        try:
+            base_gid = pwd.getpwnam(self.current_user).pw_gid
+            names = set()
+            for gid in os.getgrouplist(self.current_user, base_gid):
+                try:
+                    names.add(grp.getgrgid(gid).gr_name)
+                except KeyError:
+                    pass
+            return names
+        except KeyError:
+            return set()
+
     def _strip_colors(self, text):
         """Removes ANSI color codes from a string."""
-        return re.sub(r'\x1b\[[0-9;]*m', '', text)
+        return ANSI_ESCAPE_RE.sub('', text)
 
     def _echo_box_title(self, title):
         title_text = f" {title} "
@@ -153,16 +317,32 @@ class PiBackendManager:
             stripped_title = self._strip_colors(title_text)
             border = "+" + "-" * (len(stripped_title)) + "+"
             
-            print(f"\n{C_CYAN}{border}{C_NC}")
-            print(f"{C_CYAN}|{C_BOLD}{C_YELLOW}{title_text}{C_NC}{C_CYAN}|{C_NC}")
-            print(f"{C_CYAN}{border}{C_NC}")
+            self._echo(f"\n{C_CYAN}{border}{C_NC}")
+            self._echo(f"{C_CYAN}|{C_BOLD}{C_YELLOW}{title_text}{C_NC}{C_CYAN}|{C_NC}")
+            self._echo(f"{C_CYAN}{border}{C_NC}")
         except OSError: # Fallback for non-interactive terminals
-            print(f"\n--- {title} ---")
+            self._echo(f"\n--- {title} ---")
 
-    def _echo_step(self, msg): print(f"  {C_CYAN}>{C_NC} {C_BOLD}{msg}{C_NC}")
-    def _echo_ok(self, msg): print(f"    {C_GREEN}v{C_NC} {msg}")
-    def _echo_warn(self, msg): print(f"    {C_YELLOW}!{C_NC} {msg}")
-    def _echo_error(self, msg): print(f"    {C_RED}x{C_NC} {msg}")
+    def _echo(self, line):
+        """Prints a line, or collects it if this thread is inside _run_buffered."""
+        buffer = getattr(self._output, 'buffer', None)
+        if buffer is not None: buffer.append(line)
+        else: print(line)
+
+    def _run_buffered(self, func):
+        """Runs func with its _echo_* output collected instead of printed. Returns (lines, exception)."""
+        self._output.buffer = lines = []
+        try:
+            func()
+            return lines, None
+        except BaseException as e:
+            return lines, e
+        finally:
+            self._output.buffer = None
+    def _echo_step(self, msg): self._echo(f"  {C_CYAN}>{C_NC} {C_BOLD}{msg}{C_NC}")
+    def _echo_ok(self, msg): self._echo(f"    {C_GREEN}v{C_NC} {msg}")
+    def _echo_warn(self, msg): self._echo(f"    {C_YELLOW}!{C_NC} {msg}")
+    def _echo_error(self, msg): self._echo(f"    {C_RED}x{C_NC} {msg}")
     def _press_enter(self): input(f"\n  Press ENTER to continue...")
     
     def _display_header(self):
@@ -196,15 +376,55 @@ class PiBackendManager:
 
     # --- Database Interaction (Corrected) ---
     def _get_db_connection(self):
-        """Establishes and returns a database connection."""
+        """Returns the shared database connection, opening it on first use."""
+        if self._conn is not None:
+            try:
+                if self._conn_path == self.db_path:
+                    self._conn.total_changes # Raises if the connection was closed
+                    return self._conn
+            except sqlite3.ProgrammingError:
+                pass
+            self.close()
         try:
             conn = sqlite3.connect(self.db_path)
             conn.row_factory = sqlite3.Row
+            # Per-connection tuning only. The journal mode is deliberately left alone:
+            # switching to WAL here would leave root-owned -wal/-shm files that the
+            # www-data services can't open, so the runtime picks the journal mode.
+            try:
+                conn.execute("PRAGMA synchronous=NORMAL;")
+                conn.execute("PRAGMA temp_store=MEMORY;")
+                conn.execute(f"PRAGMA cache_size={DB_CACHE_SIZE_KIB};")
+            except sqlite3.OperationalError as e:
+                self._echo_warn(f"Could not apply connection pragmas, using SQLite defaults: {e}")
+            self._conn, self._conn_path = conn, self.db_path
             return conn
         except sqlite3.Error as e:
             self._echo_error(f"Database connection error: {e}")
             return None
 
+    def close(self):
+        """Closes the shared database connection and the sudo file helper, if open."""
+        if self._sudo_helper:
+            try:
+                self._sudo_helper.stdin.close()
+                self._sudo_helper.wait(timeout=5)
+            except (OSError, subprocess.TimeoutExpired):
+                self._sudo_helper.kill()
+            self._sudo_helper = None
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except sqlite3.Error:
+                pass
+        self._conn = None
+        self._conn_path = None
+        self._cfg_cache = {}
+
+    def __del__(self):
+        if getattr(self, '_conn', None) is not None or getattr(self, '_sudo_helper', None):
+            self.close()
+
     def _initialize_database(self, retry=True):
         """Initializes the database, recreating if it's readonly."""
         self._echo_step("Initializing/Verifying database schema...")
@@ -232,30 +452,30 @@ class PiBackendManager:
         except sqlite3.Error as e:
             if "readonly database" in str(e).lower() and retry:
                 self._echo_warn(f"Database is readonly. Attempting to fix by recreating...")
-                if conn: conn.close()
+                self.close()
                 self._run_command(['rm', '-f', self.db_path])
                 return self._initialize_database(retry=False) 
             else:
                 self._echo_error(f"Failed to initialize tables: {e}")
                 return False
-        finally:
-            if conn: conn.close()
             
     def _get_config_from_db(self, section, key, fallback=''):
         """Gets a config value from the DB using the correct key format."""
         full_key = f"{section}_{key}"
         conn = self._get_db_connection()
         if not conn: return fallback
+        if full_key in self._cfg_cache:
+            value = self._cfg_cache[full_key]
+            return fallback if value is None else value
         try:
             cursor = conn.cursor()
             cursor.execute("SELECT value FROM configuration WHERE key = ?", (full_key,))
             row = cursor.fetchone()
+            self._cfg_cache[full_key] = row['value'] if row else None
             return row['value'] if row else fallback
         except sqlite3.Error as e:
             self._echo_error(f"Failed to get config '{full_key}' from DB: {e}")
             return fallback
-        finally:
-            if conn: conn.close()
             
     def _set_config_in_db(self, section, key, value):
         """Sets a config value in the DB using the correct key format."""
@@ -264,19 +484,25 @@ class PiBackendManager:
         if not conn: return False
         try:
             cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO configuration (key, value, updated_at)
-                VALUES (?, ?, CURRENT_TIMESTAMP)
-                ON CONFLICT(key) DO UPDATE SET value = excluded.value, updated_at = CURRENT_TIMESTAMP
-            """, (full_key, str(value)))
+            cursor.execute(self._UPSERT_CONFIG_SQL, (full_key, str(value)))
             conn.commit()
+            self._cfg_cache[full_key] = str(value)
             self._echo_ok(f"Config set in DB: {full_key} = {value}")
             return True
         except sqlite3.Error as e:
             self._echo_error(f"Failed to set config in DB for key '{full_key}': {e}")
             return False
-        finally:
-            if conn: conn.close()
+
+    def _insert_new_config(self, rows):
+        """Inserts (full_key, value) rows in one transaction, leaving existing keys untouched. Returns rows inserted."""
+        conn = self._get_db_connection()
+        if not conn: return 0
+        before = conn.total_changes
+        with conn:
+            conn.executemany(self._INSERT_NEW_CONFIG_SQL, rows)
+        for full_key, _ in rows:
+            self._cfg_cache.pop(full_key, None)
+        return conn.total_changes - before
             
     # --- Core Logic Functions ---
     def _configure_database_path(self):
@@ -321,8 +547,17 @@ class PiBackendManager:
         
         self._configure_database_path()
 
-        self.configure_gpsd()
-        self.configure_chrony_for_gps()
+        # chrony's SHM refclock depends on gpsd, so those two stay in order. Only the
+        # Skyfield download overlaps them; its output is buffered and printed after.
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            skyfield = executor.submit(self._run_buffered, self.download_skyfield_data)
+            self.configure_gpsd()
+            self.configure_chrony_for_gps()
+            skyfield_output, skyfield_error = skyfield.result()
+        for line in skyfield_output:
+            self._echo(line)
+        if skyfield_error is not None:
+            raise skyfield_error
         self.deploy_and_manage_files()
         
         if not self._initialize_database():
@@ -358,14 +593,20 @@ class PiBackendManager:
             os.path.dirname(self.db_path), self.pi_backend_home_dir,
             # self.ups_daemon_state_dir # Removed: No longer needed
         ]
-        self._run_command(['mkdir', '-p', self.log_dir])
-        self._run_command(['chown', 'www-data:www-data', self.log_dir])
-        self._run_command(['chmod', '755', self.log_dir])
-        
-        for d in dirs_to_create:
-            self._run_command(['mkdir', '-p', d])
+        log_dir = shlex.quote(self.log_dir)
+        home_dir = shlex.quote(self.pi_backend_home_dir)
+        owner = shlex.quote(f'{self.current_user}:{self.current_user}')
+        # One privileged shell for every mkdir/chown/chmod instead of a sudo call each.
+        script = (
+            f"mkdir -p {log_dir} {' '.join(shlex.quote(d) for d in dirs_to_create)}"
+            f" && chown www-data:www-data {log_dir} && chmod 755 {log_dir}"
+            f" && chown {owner} {home_dir}"
+        )
+        result = self._run_command(['sh', '-c', script])
+        if not result or result.returncode != 0:
+            self._echo_error("Failed to create or set permissions on one or more directories.")
+            return
         
-        self._run_command(['chown', f'{self.current_user}:{self.current_user}', self.pi_backend_home_dir], as_sudo=True)
         # Removed: ups_daemon_state_dir management
         # self._run_command(['chown', 'www-data:www-data', self.ups_daemon_state_dir])
         # self._run_command(['chmod', '775', self.ups_daemon_state_dir])
@@ -376,8 +617,9 @@ class PiBackendManager:
         self._echo_box_title("Verifying System Prerequisites")
         
         self._echo_step(f"Adding current user ({self.current_user}) to 'www-data' and 'i2c' groups...")
+        user_groups = self._get_user_groups()
         for group in ['www-data', 'i2c']:
-            if self._run_command(['groups', self.current_user], as_sudo=False, capture=True).stdout.find(group) == -1:
+            if group not in user_groups:
                 self._run_command(['usermod', '-a', '-G', group, self.current_user])
                 self._echo_warn(f"User added to '{group}' group. A logout/login is required for all changes to take full effect.")
             else:
@@ -398,11 +640,17 @@ class PiBackendManager:
         ]
         
         self._echo_step("Checking required system packages...")
-        packages_to_install = []
-        for pkg in apt_packages:
-            result = self._run_command(['dpkg', '-s', pkg], as_sudo=False, capture=True)
-            if not (result and result.returncode == 0):
-                packages_to_install.append(pkg)
+        # One dpkg-query for every package instead of a `dpkg -s` per package.
+        # Packages dpkg doesn't know at all are simply absent from the output.
+        result = self._run_command(['dpkg-query', '-W', '-f=${Package} ${Status}\n'] + apt_packages,
+                                   as_sudo=False, capture=True)
+        installed = set()
+        if result and result.stdout:
+            for line in result.stdout.splitlines():
+                pkg, _, status = line.partition(' ')
+                if status.endswith(' installed'):
+                    installed.add(pkg)
+        packages_to_install = [pkg for pkg in apt_packages if pkg not in installed]
         
         if packages_to_install:
             self._echo_warn(f"The following packages will be installed: {', '.join(packages_to_install)}")
@@ -427,7 +675,6 @@ class PiBackendManager:
             self._run_command(['journalctl', '-u', 'apache2', '--no-pager', '-n', '20'])
             sys.exit(1)
             
-        self.download_skyfield_data()
         self._echo_ok("Prerequisites check complete.")
 
     def migrate_ini_to_db(self):
@@ -449,17 +696,17 @@ class PiBackendManager:
 
             parser = configparser.ConfigParser()
             parser.read(deployed_config_file)
-            for section in parser.sections():
-                for key, value in parser.items(section):
-                    self._set_config_in_db(section, key, value)
+            rows = [(f"{section}_{key}", str(value))
+                    for section in parser.sections()
+                    for key, value in parser.items(section)]
+            # The table is empty here, so a plain insert (no upsert) in one transaction.
+            inserted = self._insert_new_config(rows)
             
-            self._echo_ok("Configuration successfully migrated to database.")
+            self._echo_ok(f"Configuration successfully migrated to database ({inserted} keys).")
             self._run_command(['rm', '-f', deployed_config_file])
             self._echo_ok("Removed old .ini file.")
         except Exception as e:
             self._echo_error(f"Failed to migrate INI config: {e}")
-        finally:
-            if conn: conn.close()
     
     def _get_cert_details(self, domain):
         """Gets details for a specific SSL certificate."""
@@ -467,21 +714,20 @@ class PiBackendManager:
         
         details = {'domain': domain}
         try:
-            # Get expiry date
-            expiry_cmd = ['openssl', 'x509', '-in', cert_path, '-noout', '-enddate']
-            expiry_result = self._run_command(expiry_cmd, capture=True)
-            if expiry_result and expiry_result.returncode == 0:
-                expiry_str = expiry_result.stdout.replace("notAfter=", "").strip()
-                expiry_date = datetime.strptime(expiry_str, "%b %d %H:%M:%S %Y %Z")
-                details['expiry_date'] = expiry_date.strftime("%Y-%m-%d")
-                days_left = (expiry_date - datetime.now()).days
-                details['days_remaining'] = days_left
-            
-            # Get fingerprint
-            fp_cmd = ['openssl', 'x509', '-in', cert_path, '-noout', '-fingerprint', '-sha256']
-            fp_result = self._run_command(fp_cmd, capture=True)
-            if fp_result and fp_result.returncode == 0:
-                details['fingerprint'] = fp_result.stdout.replace("SHA256 Fingerprint=", "").strip()
+            # Expiry date and fingerprint from a single openssl invocation
+            cert_cmd = ['openssl', 'x509', '-in', cert_path, '-noout', '-enddate', '-fingerprint', '-sha256']
+            cert_result = self._run_command(cert_cmd, capture=True)
+            if cert_result and cert_result.returncode == 0:
+                expiry_match = self._CERT_ENDDATE_RE.search(cert_result.stdout)
+                if expiry_match:
+                    expiry_date = datetime.strptime(expiry_match.group(1).strip(), "%b %d %H:%M:%S %Y %Z")
+                    details['expiry_date'] = expiry_date.strftime("%Y-%m-%d")
+                    days_left = (expiry_date - datetime.now()).days
+                    details['days_remaining'] = days_left
+
+                fp_match = self._CERT_FINGERPRINT_RE.search(cert_result.stdout)
+                if fp_match:
+                    details['fingerprint'] = fp_match.group(1).strip()
 
             return details
         except Exception as e:
@@ -494,14 +740,14 @@ class PiBackendManager:
         
         # Proactively scan for any existing certificates using sudo
         live_certs_path = "/etc/letsencrypt/live"
-        existing_certs_result = self._run_command(['ls', '-1', live_certs_path], capture=True)
+        # One privileged `find` lists only the directories (skipping entries like README),
+        # instead of `ls` plus a `test -d` subprocess per entry.
+        existing_certs_result = self._run_command(
+            ['find', live_certs_path, '-mindepth', '1', '-maxdepth', '1', '-type', 'd', '-printf', '%f\n'],
+            capture=True)
         existing_certs = []
         if existing_certs_result and existing_certs_result.returncode == 0:
-             # Filter out non-directory entries like README
-            for d in existing_certs_result.stdout.splitlines():
-                check_dir_cmd = self._run_command(['test', '-d', os.path.join(live_certs_path, d)], check=False)
-                if check_dir_cmd.returncode == 0:
-                    existing_certs.append(d)
+            existing_certs = sorted(existing_certs_result.stdout.splitlines())
 
         # If we have a domain in the DB and a matching cert exists, we are done.
         if self.apache_domain and self.apache_domain in existing_certs:
@@ -574,8 +820,7 @@ class PiBackendManager:
                 return False
             with open(template_path, 'r') as f:
                 content = f.read()
-            for key, value in replacements.items():
-                content = content.replace(key, str(value))
+            content = self._substitute_placeholders(content, replacements)
             self._write_sudo_file(output_file, content)
             self._echo_ok(f"Generated config: {output_file}")
             return True
@@ -630,8 +875,8 @@ class PiBackendManager:
             return
 
         original_content = content
-        content = re.sub(r'^DEVICES=".*"', f'DEVICES="{self.gps_device}"', content, count=1, flags=re.MULTILINE)
-        content = re.sub(r'^GPSD_OPTIONS=".*"', 'GPSD_OPTIONS="-n"', content, count=1, flags=re.MULTILINE)
+        content = self._GPSD_DEVICES_RE.sub(f'DEVICES="{self.gps_device}"', content, count=1)
+        content = self._GPSD_OPTIONS_RE.sub('GPSD_OPTIONS="-n"', content, count=1)
 
         if content != original_content:
             self._echo_ok("Updating GPSD configuration.")
@@ -772,8 +1017,9 @@ class PiBackendManager:
         self.manage_database_location()
         
         self._echo_step(f"Adding current user ({self.current_user}) to required groups...")
+        user_groups = self._get_user_groups()
         for group in ['dialout', 'i2c', 'gpio', 'input']:
-            if self._run_command(['groups', self.current_user], as_sudo=False, capture=True).stdout.find(group) == -1:
+            if group not in user_groups:
                 self._run_command(['usermod', '-a', '-G', group, self.current_user])
                 self._echo_warn(f"Added user to group '{group}'. A logout/login may be required.")
         
@@ -787,8 +1033,7 @@ class PiBackendManager:
         with open(template_path, 'r') as f:
             content = f.read()
         
-        for key, value in replacements_dict.items():
-            content = content.replace(key, str(value))
+        content = self._substitute_placeholders(content, replacements_dict)
         
         self._write_sudo_file(output_file, content)
         self._echo_ok(f"Generated service file: {output_file}")
@@ -885,7 +1130,7 @@ class PiBackendManager:
 
     def download_skyfield_data(self):
         self._echo_box_title("Downloading Skyfield Astronomy Data")
-        self._run_command(['mkdir', '-p', self.skyfield_data_dir])
+        self._run_quiet(['mkdir', '-p', self.skyfield_data_dir])
         
         files_to_download = {
             "de442s.bsp": "https://naif.jpl.nasa.gov/pub/naif/generic_kernels/spk/planets/de442s.bsp",
@@ -905,12 +1150,12 @@ class PiBackendManager:
                 temp_dest_path = f"/tmp/{filename}"
                 with open(temp_dest_path, "wb") as f:
                     shutil.copyfileobj(response.raw, f)
-                self._run_command(['mv', temp_dest_path, dest_path])
+                self._run_quiet(['mv', temp_dest_path, dest_path])
                 self._echo_ok(f"'{filename}' downloaded successfully.")
             except requests.exceptions.RequestException as e:
                 self._echo_error(f"Failed to download '{filename}': {e}")
         
-        self._run_command(['chown', '-R', 'www-data:www-data', self.skyfield_data_dir])
+        self._run_quiet(['chown', '-R', 'www-data:www-data', self.skyfield_data_dir])
         
     # --- Menu Implementations ---
     def _edit_config_file(self, file_path, description):
@@ -1398,7 +1643,10 @@ class PiBackendManager:
 if __name__ == "__main__":
     try:
         manager = PiBackendManager()
-        manager.run()
+        try:
+            manager.run()
+        finally:
+            manager.close()
     except KeyboardInterrupt:
         print("\n\nScript interrupted by user. Exiting.")
         sys.exit(1)